@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# Turning many parsed titles into columns: Columns against building the
+# same flat columns a row at a time from Title.__dict__, and the whole way
+# to a pyarrow table against pyarrow converting the rows itself. The numpy
+# and pyarrow steps are only run if those are installed, pyarrow 0.16 is the
+# last release for Python 2.
+#
+#   python benchmarks/bench_columns.py [-n TITLES]
+import argparse
+from collections import defaultdict
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import imdb
+import corpus
+
+
+def timed(label, n, fn):
+    start = time.time()
+    result = fn()
+    elapsed = time.time() - start
+    print '%-32s %10.0f titles/s %8.1f ms' % (label, n / elapsed, elapsed * 1000)
+    return result
+
+def flatrows(titles):
+    # The columns of Columns, filled in title by title and field by field.
+    data = defaultdict(list)
+    def number(name, value):
+        data[name].append(0 if value is None else value)
+        data[name + '.valid'].append(value is not None)
+    def end(name, values):
+        offsets = data[name + '.offsets']
+        if not offsets:
+            offsets.append(0)
+        offsets.append(len(data[values]))
+    for t in titles:
+        for name, kind in imdb._columntypes[imdb.TitleRecord]:
+            value = t.__dict__.get(name)
+            if kind == 'str':
+                data[name].append(value)
+            elif kind == 'int':
+                number(name, value)
+            elif kind == 'decimal':
+                number(name, None if value is None else int(value.scaleb(imdb.Columns.ratingscale)))
+            elif kind == 'list':
+                data[name].extend(value or ())
+                end(name, name)
+            elif kind in ('people', 'writers'):
+                subfields = ('name', 'id', 'role') if kind == 'writers' else ('name', 'id')
+                for entry in value or ():
+                    for i, field in enumerate(subfields):
+                        data['%s.%s' % (name, field)].append(entry[i] if len(entry) > i else None)
+                end(name, name + '.name')
+            elif kind == 'release':
+                number(name + '.date', (value[0] - imdb._epoch).days if value else None)
+                data[name + '.country'].append(value[1] if value else None)
+            elif kind == 'cast':
+                for (castname, castid), characters in value or ():
+                    data[name + '.name'].append(castname)
+                    data[name + '.id'].append(castid)
+                    for character, characterid in characters:
+                        data[name + '.characters.name'].append(character)
+                        data[name + '.characters.id'].append(characterid)
+                    end(name + '.characters', name + '.characters.name')
+                end(name, name + '.name')
+    return data
+
+def dictrows(titles):
+    # The nested rows pyarrow converts itself, lists of dicts for structs.
+    def people(value, fields):
+        return [dict(zip(fields, entry)) for entry in value or ()]
+    rows = []
+    for t in titles:
+        row = dict((name, t.__dict__.get(name)) for name in imdb.TitleRecord._fields)
+        row['directors'] = people(row['directors'], ('name', 'id'))
+        row['writers'] = people(row['writers'], ('name', 'id', 'role'))
+        release = row['release']
+        row['release'] = {'date': release[0], 'country': release[1]} if release else None
+        row['cast'] = [{'name': name, 'id': id, 'characters': people(characters, ('name', 'id'))}
+                       for (name, id), characters in row['cast'] or ()]
+        rows.append(row)
+    return rows
+
+def optional(name):
+    try:
+        return __import__(name)
+    except ImportError:
+        print '%-32s not installed' % name
+        return None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20000, help='titles to convert')
+    args = parser.parse_args()
+    n = args.n
+
+    imdb.defaulttransport = corpus.FixtureTransport()
+    title = imdb.Title('tt0133093', fullplot=True)
+    titles = [title] * n
+
+    flat = timed('rows, flattened', n, lambda: flatrows(titles))
+    columns = timed('Columns', n, lambda: imdb.Columns(titles))
+    records = [title.record()] * n
+    timed('Columns from records', n, lambda: imdb.Columns(records))
+    for name, values in columns.data.items():
+        assert list(values) == flat[name], name
+
+    if optional('numpy'):
+        timed('Columns.tonumpy', n, columns.tonumpy)
+    pyarrow = optional('pyarrow')
+    if pyarrow:
+        # From the titles to the same table both ways. Table.from_pylist is
+        # newer than the last pyarrow for Python 2, the rows go through a
+        # struct array instead.
+        schema = imdb.Columns(titles[:1]).toarrow().schema
+        def fromrows():
+            rows = pyarrow.array(dictrows(titles), pyarrow.struct(list(schema)))
+            return pyarrow.Table.from_arrays(rows.flatten(), schema.names)
+        table = timed('titles to pyarrow, rows', n, fromrows)
+        timed('titles to pyarrow via Columns', n, lambda: imdb.Columns(titles).toarrow())
+        assert table.schema.equals(schema)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# parsedate against the strptime call it replaced, on distinct dates (every
+# one parsed for the first time) and on dates already seen.
+#
+#   python benchmarks/bench_dates.py [-n DATES]
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import imdb
+
+
+def strptime(text):
+    return datetime.date(*datetime.datetime.strptime(text, '%d %B %Y').timetuple()[:3])
+
+def timed(label, texts, fn):
+    start = time.time()
+    for text in texts:
+        fn(text)
+    elapsed = time.time() - start
+    print '%-28s %8.2f us/date' % (label, elapsed * 1e6 / len(texts))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=50000, help='dates to parse')
+    args = parser.parse_args()
+
+    start = datetime.date(1900, 1, 1)
+    texts = [(start + datetime.timedelta(days=i)).strftime('%d %B %Y').lstrip('0') for i in xrange(args.n)]
+
+    timed('strptime', texts, strptime)
+    imdb._dates.clear()
+    timed('parsedate, first time', texts, imdb.parsedate)
+    timed('parsedate, seen before', texts, imdb.parsedate)
+
+if __name__ == '__main__':
+    main()
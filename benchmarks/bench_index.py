@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# Lookups in a SearchIndex filled with made up titles: exact titles, titles
+# given in a different word order and misspelled titles.
+#
+#   python benchmarks/bench_index.py [-n TITLES] [-l LOOKUPS]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import imdb
+
+
+WORDS = ('night day house love dead man woman city war star dark river blue last return '
+         'secret king queen road black white fire ghost street dream time world heart '
+         'shadow storm island summer winter garden stranger empire hunter'.split())
+
+def word(i):
+    letters = []
+    while True:
+        i, letter = divmod(i, 26)
+        letters.append('abcdefghijklmnopqrstuvwxyz'[letter])
+        if not i:
+            return ''.join(letters)
+
+def catalogue(n):
+    random.seed(1)
+    for i in xrange(n):
+        title = ' '.join(random.choice(WORDS) for j in xrange(random.randint(1, 3)))
+        title = '%s %s' % (title.title(), word(i).title())
+        yield imdb.TitleRecord(*([None] * len(imdb.TitleRecord._fields)))._replace(
+            id='tt%07d' % i, title=title, year=1920 + i % 100,
+            alsoknownas=['%s (Sweden)' % title[::-1]] if i % 4 == 0 else [])
+
+def misspell(title):
+    i = random.randrange(len(title))
+    return title[:i] + 'x' + title[i + 1:]
+
+def timed(label, queries, fn):
+    times = []
+    misses = 0
+    for query in queries:
+        start = time.time()
+        if not fn(query):
+            misses += 1
+        times.append(time.time() - start)
+    times.sort()
+    print '%-24s %8.1f us/lookup %8.1f us 99th percentile %6d misses' % (
+        label, sum(times) * 1e6 / len(times), times[len(times) * 99 // 100] * 1e6, misses)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=1000000, help='titles to index')
+    parser.add_argument('-l', type=int, default=2000, help='lookups per kind')
+    args = parser.parse_args()
+
+    records = list(catalogue(args.n))
+    start = time.time()
+    index = imdb.SearchIndex(records)
+    print '%d titles, %d entries indexed in %.1f s' % (args.n, len(index), time.time() - start)
+
+    random.seed(2)
+    titles = [record.title for record in random.sample(records, min(args.l, args.n))]
+    timed('exact', titles, index.titles)
+    timed('reordered', [' '.join(reversed(t.split())) for t in titles], index.titles)
+    timed('misspelled', [misspell(t) for t in titles], index.titles)
+    timed('unknown', ['Nothing Like This %d' % i for i in xrange(len(titles))], index.titles)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# Peak memory of a worker that keeps what it made while working through a
+# batch of titles, with and without closing them. Every mode runs in a
+# process of its own so that the peaks do not mix.
+#
+#   python benchmarks/bench_memory.py [-n TITLES]
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import imdb
+import corpus
+
+
+def lazy(n, close):
+    titles = []
+    for i in xrange(n):
+        title = imdb.Title('tt0133093', lazy=True)
+        title.title
+        if close:
+            title.close()
+        titles.append(title)
+    return titles
+
+def eager(n, close):
+    return [imdb.Title('tt0133093', fullplot=True) for i in xrange(n)]
+
+def searches(n, close):
+    kept = []
+    for i in xrange(n):
+        search = imdb.TitleSearch('The Matrix (1999)')
+        if close:
+            search.close()
+        kept.append(search)
+    return kept
+
+def run(fn, n, close, queue):
+    imdb.defaulttransport = corpus.FixtureTransport()
+    imdb.defaultstats = imdb.Stats()
+    kept = fn(n, close)
+    counters, timings = imdb.defaultstats.snapshot()
+    queue.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+               counters.get('trees.held', 0), counters.get('trees.released', 0)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=2000, help='titles or searches kept')
+    args = parser.parse_args()
+
+    for label, fn, close in (('lazy titles, one field read', lazy, False),
+                             ('lazy titles, closed', lazy, True),
+                             ('eager titles', eager, False),
+                             ('redirected searches', searches, False),
+                             ('redirected searches, closed', searches, True)):
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run, args=(fn, args.n, close, queue))
+        process.start()
+        process.join()
+        if process.exitcode:
+            print '%-30s failed' % label
+            continue
+        peak, held, released = queue.get()
+        print '%-30s peak RSS %7.1f MB %7d trees held %7d released' % (label, peak, held, released)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# Parse throughput of Title, Name, TitleSearch and NameSearch on the saved
+# pages in benchmarks/pages. No requests are made to IMDb.
+#
+#   python benchmarks/bench_parse.py [-n ITERATIONS] [--stats]
+import argparse
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import imdb
+import corpus
+
+
+def rate(label, pages, n, fn):
+    start = time.time()
+    for i in xrange(n):
+        fn()
+    elapsed = time.time() - start
+    print '%-28s %8.1f pages/s %8.3f ms/call' % (label, pages * n / elapsed, elapsed / n * 1000)
+
+def fieldtimes(cls, url, id, n):
+    times = {}
+    for i in xrange(n):
+        # Fields modify the page, so every run gets a freshly parsed one.
+        data = imdb.parsepage(imdb.fetch(url, None))
+        obj = cls(imdb.SearchResult(None, id, data=data), lazy=True)
+        for method in imdb.OrderedDict.fromkeys(cls._fields.values() + cls._extrafields.values()):
+            start = time.time()
+            obj._parsefield(method)
+            times[method] = times.get(method, 0) + time.time() - start
+    for method, total in sorted(times.items(), key=lambda x: -x[1]):
+        print '  %-26s %8.1f us' % (method, total / n * 1e6)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=200, help='iterations per benchmark')
+    parser.add_argument('--stats', action='store_true', help='run with instrumentation enabled and print it')
+    args = parser.parse_args()
+    n = args.n
+
+    imdb.defaulttransport = corpus.FixtureTransport()
+    if args.stats:
+        imdb.defaultstats = imdb.Stats()
+    title = imdb.Title('tt0133093', fullplot=True)
+    name = imdb.Name('nm0000206')
+
+    rate('Title.update (+plotsummary)', 2, n, title.update)
+    rate('Name.update (+filmorate)', 2, n, name.update)
+    rate('TitleSearch.search', 1, n, lambda: imdb.TitleSearch('matrix'))
+    rate('TitleSearch.search redirect', 1, n, lambda: imdb.TitleSearch('The Matrix (1999)'))
+    rate('NameSearch.search', 1, n, lambda: imdb.NameSearch('james cameron'))
+
+    if args.stats:
+        print
+        print imdb.defaultstats
+        imdb.defaultstats = None
+
+    print
+    print 'Title fields'
+    fieldtimes(imdb.Title, 'http://www.imdb.com/title/tt0133093/', 'tt0133093', n)
+    print 'Name fields'
+    fieldtimes(imdb.Name, 'http://www.imdb.com/name/nm0000206/', 'nm0000206', n)
+
+    print
+    print 'peak RSS %.1f MB' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# Throughput of parsetitles and parsenames on the saved pages in
+# benchmarks/pages for an increasing number of worker processes.
+#
+#   python benchmarks/bench_scaling.py [-n ITEMS] [-p PROCESSES ...]
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import imdb
+import corpus
+
+
+def items(pages, urls, id, n):
+    subset = dict((url, pages[url]) for url in urls)
+    for i in xrange(n):
+        yield (id, subset)
+
+def run(label, fn, pagecount, n, processeslist):
+    base = None
+    for processes in processeslist:
+        start = time.time()
+        errors = sum(1 for id, record, error in fn(processes) if error is not None)
+        elapsed = time.time() - start
+        rate = pagecount * n / elapsed
+        base = base or rate
+        print '%-12s %3d processes %9.1f pages/s %6.2fx%s' % (
+            label, processes, rate, rate / base, ' (%d errors)' % errors if errors else '')
+
+def main():
+    cpus = multiprocessing.cpu_count()
+    default = sorted(set([1, 2, 4, 8, 16, cpus]) & set(range(1, cpus + 1)))
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=2000, help='items per run')
+    parser.add_argument('-p', type=int, nargs='+', default=default, help='process counts to run with')
+    parser.add_argument('--chunksize', type=int, default=8)
+    args = parser.parse_args()
+    n = args.n
+
+    pages = corpus.load()
+    titleurls = ['http://www.imdb.com/title/tt0133093/', 'http://www.imdb.com/title/tt0133093/plotsummary']
+    nameurls = ['http://www.imdb.com/name/nm0000206/', 'http://www.imdb.com/name/nm0000206/filmorate']
+
+    print '%d cpus' % cpus
+    run('parsetitles', lambda p: imdb.parsetitles(items(pages, titleurls, 'tt0133093', n), p,
+                                                     args.chunksize, fullplot=True),
+        2, n, args.p)
+    run('parsenames', lambda p: imdb.parsenames(items(pages, nameurls, 'nm0000206', n), p,
+                                                   args.chunksize),
+        2, n, args.p)
+
+if __name__ == '__main__':
+    main()
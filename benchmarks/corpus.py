@@ -0,0 +1,50 @@
+# The saved pages in pages/ and the urls they are served for.
+from cStringIO import StringIO
+import os
+import urllib2
+
+import imdb
+
+PAGEDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+PAGES = {
+    'http://www.imdb.com/title/tt0133093/': 'title_tt0133093.html',
+    'http://www.imdb.com/title/tt0133093/plotsummary': 'plotsummary_tt0133093.html',
+    'http://www.imdb.com/name/nm0000206/': 'name_nm0000206.html',
+    'http://www.imdb.com/name/nm0000206/filmorate': 'filmorate_nm0000206.html',
+    'http://www.imdb.com/find?s=tt&q=matrix': 'find_tt_matrix.html',
+    'http://www.imdb.com/find?s=nm&q=james%20cameron': 'find_nm_james_cameron.html',
+}
+
+# Searches that are redirected straight to the only match.
+REDIRECTS = {
+    'http://www.imdb.com/find?s=tt&q=The%20Matrix': 'http://www.imdb.com/title/tt0133093/',
+}
+
+def load():
+    pages = {}
+    for url, filename in PAGES.items():
+        f = open(os.path.join(PAGEDIR, filename), 'rb')
+        try:
+            pages[url] = (url, f.read())
+        finally:
+            f.close()
+    for url, target in REDIRECTS.items():
+        pages[url] = (target, pages[target][1])
+    return pages
+
+
+class FixtureTransport(imdb.Transport):
+    # Serves the saved pages in place of the network. Any other url fails
+    # with a 404 so that a benchmark can never reach the real site.
+    def __init__(self):
+        self.pages = load()
+        self.requests = 0
+
+    def open(self, url, headers=None):
+        try:
+            finalurl, body = self.pages[url]
+        except KeyError:
+            raise urllib2.HTTPError(url, 404, 'Not Found', {}, None)
+        self.requests += 1
+        return imdb.Response(finalurl, 200, {}, StringIO(body))
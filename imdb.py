@@ -1,10 +1,33 @@
 #!/usr/bin/env python
+import argparse
+from array import array
+import cPickle
+from collections import deque, namedtuple, OrderedDict
+from cStringIO import StringIO
 import datetime
 from decimal import Decimal
+import gzip
+import httplib
+from itertools import combinations, groupby, islice, product
+import json
+import multiprocessing
+import os
+import random
 import re
+import socket
+import sqlite3
+import sys
+import Queue
+import tarfile
+import threading
+import time
 import urllib2
+import urlparse
+import zlib
 
-from lxml.html import parse
+from lxml import etree
+from lxml.cssselect import CSSSelector
+from lxml.html import document_fromstring
 
 __version__ = '0.1.0'
 
@@ -12,33 +35,1077 @@ asciionly = re.compile(r'[^a-zA-Z]')
 numonly = re.compile(r'[^0-9]')
 findyear = re.compile(r' \(?(?P<year>\d{4})(?:/[IV]*)?\)')
 findid = re.compile(r'(?P<id>(?:tt|nm|ch)\d{7})', re.I)
+# Every CSS selector used while parsing, translated to XPath once at import
+# instead of on every cssselect() call.
+plan = {
+    'infodivs': CSSSelector('#tn15content div.info'),
+    'more': CSSSelector('.tn15more'),
+    'rating': CSSSelector('div .starbar-meta b'),
+    'votes': CSSSelector('div .starbar-meta a'),
+    'top': CSSSelector('div .starbar-special a'),
+    # All actor and character cells of the cast table in one pass. Written
+    # as a single path since a CSS selector group becomes an XPath union,
+    # which libxml2 merges in quadratic time.
+    'cast': etree.XPath("descendant-or-self::table[contains(concat(' ', normalize-space(@class), ' '), ' cast ')]"
+                        "/descendant::tr/*[contains(concat(' ', normalize-space(@class), ' '), ' nm ')"
+                        " or contains(concat(' ', normalize-space(@class), ' '), ' char ')]"),
+    'photo': CSSSelector('div.photo img'),
+    'plotpar': CSSSelector('p.plotpar'),
+    'filmography': CSSSelector('.filmo li > a'),
+    'results': CSSSelector('td[valign="top"]'),
+}
+
 def getid(str):
     m = findid.search(str)
     if m:
         return m.group('id')
     return None
+
+def normalizeid(id, prefix):
+    if isinstance(id, (int, long)) and (0 <= id <= 9999999):
+        id = '%07d' % id
+    m = re.search(r'(?:%s)?(?P<id>\d{7})' % prefix, id, re.I)
+    if m:
+        return '%s%s' % (prefix, m.group('id'))
+    raise ValueError('Invalid IMDB id. (%s)' % id)
+
+# English month names and their abbreviations, IMDb dates are in English
+# whatever the locale.
+_months = dict((name.lower(), number) for number, name in enumerate(
+    'January February March April May June July August September October November December'.split(), 1))
+_months.update([(name[:3], number) for name, number in _months.items()])
+# Dates already parsed, cleared when it grows past _maxdates.
+_dates = {}
+_maxdates = 100000
+
+def parsedate(text):
+    # Reads '31 March 1999', 'March 31, 1999', 'March 1999' and '1999'. A
+    # missing day or month is taken to be the first. Returns None for
+    # anything else.
+    try:
+        return _dates[text]
+    except (KeyError, TypeError):
+        if not isinstance(text, basestring):
+            return None
+    date = None
+    parts = text.replace(',', ' ').split()
+    try:
+        if len(parts) == 3:
+            if parts[0].isdigit():
+                day, month, year = parts
+            else:
+                month, day, year = parts
+            date = datetime.date(int(year), _months[month.lower()], int(day))
+        elif len(parts) == 2:
+            date = datetime.date(int(parts[1]), _months[parts[0].lower()], 1)
+        elif len(parts) == 1:
+            date = datetime.date(int(parts[0]), 1, 1)
+    except (KeyError, ValueError):
+        pass
+    if len(_dates) >= _maxdates:
+        _dates.clear()
+    _dates[text] = date
+    return date
     
 class InvalidIDException(Exception):
     def __str__(self):
         return repr(self.args[0])
 
-class Title(object):
-    def __init__(self, id, fullplot = False):
+# Raised when a page can not be downloaded. They are ValueErrors since that is
+# what a missing title or name has always raised.
+class FetchError(ValueError):
+    def __init__(self, message, url=None, status=None):
+        ValueError.__init__(self, message)
+        self.url = url
+        self.status = status
+
+class NotFoundError(FetchError):
+    pass
+
+class ThrottledError(FetchError):
+    pass
+
+class CircuitOpenError(FetchError):
+    pass
+
+
+# Seconds a cached page of each kind stays fresh. None never expires, 0
+# disables caching for that kind.
+DEFAULT_TTL = {
+    'title': 24 * 3600,
+    'name': 24 * 3600,
+    'filmorate': 24 * 3600,
+    'plotsummary': 7 * 24 * 3600,
+    'fullcredits': 24 * 3600,
+    'find': 3600,
+}
+
+class Cache(object):
+    def __init__(self, ttl=None):
+        self.ttl = dict(DEFAULT_TTL)
+        if ttl:
+            self.ttl.update(ttl)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, kind):
+        ttl = self.ttl.get(kind)
+        entry = None
+        if ttl != 0:
+            entry = self._get(url)
+            if entry is not None and ttl is not None and time.time() - entry[0] > ttl:
+                self._delete(url)
+                entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Entries stored before the validators were kept have none.
+        return Page(entry[1], entry[2], headers=entry[3] if len(entry) > 3 else None)
+
+    def set(self, url, kind, finalurl, body, headers=None):
+        # Only the validators of the headers are kept, for revalidating pages
+        # loaded from the cache.
+        if self.ttl.get(kind) != 0:
+            validators = dict((name, value) for name, value in (headers or {}).items()
+                              if name in ('etag', 'last-modified'))
+            self._set(url, (time.time(), finalurl, body, validators))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def _get(self, url):
+        raise NotImplementedError
+
+    def _set(self, url, entry):
+        raise NotImplementedError
+
+    def _delete(self, url):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCache(Cache):
+    def __init__(self, maxsize=1024, ttl=None):
+        Cache.__init__(self, ttl)
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, url):
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is not None:
+                self._entries[url] = entry
+            return entry
+
+    def _set(self, url, entry):
+        with self._lock:
+            self._entries.pop(url, None)
+            self._entries[url] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _delete(self, url):
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache(Cache):
+    def __init__(self, path, ttl=None):
+        Cache.__init__(self, ttl)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, entry BLOB)')
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def _get(self, url):
+        with self._lock:
+            row = self._db.execute('SELECT entry FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is not None:
+            return cPickle.loads(str(row[0]))
+        return None
+
+    def _set(self, url, entry):
+        entry = sqlite3.Binary(cPickle.dumps(entry, cPickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO pages (url, entry) VALUES (?, ?)', (url, entry))
+            self._db.commit()
+
+    def _delete(self, url):
+        with self._lock:
+            self._db.execute('DELETE FROM pages WHERE url = ?', (url,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM pages')
+            self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class _Prefetched(Cache):
+    # Serves pages downloaded ahead of time and passes everything else on to
+    # the real cache.
+    def __init__(self, pages, cache=None):
+        Cache.__init__(self)
+        self.pages = pages
+        self.cache = cache
+
+    def get(self, url, kind):
+        page = self.pages.get(url)
+        if page is None and self.cache is not None:
+            page = self.cache.get(url, kind)
+        return page
+
+    def set(self, url, kind, finalurl, body, headers=None):
+        if self.cache is not None:
+            self.cache.set(url, kind, finalurl, body, headers)
+
+
+class _Pages(Cache):
+    # Serves saved pages and nothing else, any other page is reported as
+    # missing so that nothing is downloaded. *main* is served for the first
+    # page of kind *mainkind* asked for, whatever its url.
+    def __init__(self, pages, main=None, mainkind=None):
+        Cache.__init__(self)
+        self.pages = pages
+        self.main = main
+        self.mainkind = mainkind
+
+    def get(self, url, kind):
+        page = self.pages.get(url)
+        if page is None and kind == self.mainkind and self.main is not None:
+            page, self.main = self.main, None
+            if page[0] is None:
+                page = (url, page[1])
+        if page is None:
+            raise NotFoundError('Page not available. (%s)' % url, url, 404)
+        return page
+
+    def set(self, url, kind, finalurl, body, headers=None):
+        pass
+
+
+class RateLimiter(object):
+    # A token bucket per host, filled with *rate* tokens per second up to
+    # *burst*. A request takes a token, waiting for it if there is none.
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse.urlparse(url)[1]
+        with self._lock:
+            now = time.time()
+            tokens, last = self._buckets.get(host, (self.burst, now))
+            # Tokens go negative when requests are waiting, each of them has
+            # reserved the next one.
+            tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+            self._buckets[host] = (tokens, now)
+        if tokens < 0:
+            time.sleep(-tokens / self.rate)
+
+
+class FetchPolicy(object):
+    # How every download is made: rate limited per host, retried with
+    # jittered exponential backoff on *retrystatuses* and connection errors,
+    # and failed fast with CircuitOpenError for *cooldown* seconds once a
+    # host has failed *failures* times in a row.
+    def __init__(self, rate=None, burst=1, retries=3, backoff=0.5, maxbackoff=30,
+                 retrystatuses=(429, 500, 502, 503, 504), failures=10, cooldown=30):
+        self.ratelimiter = RateLimiter(rate, burst) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.maxbackoff = maxbackoff
+        self.retrystatuses = retrystatuses
+        self.failures = failures
+        self.cooldown = cooldown
+        self._failures = {}
+        self._openuntil = {}
+        self._lock = threading.Lock()
+
+    def _allow(self, host):
+        with self._lock:
+            until = self._openuntil.get(host)
+            if until is None:
+                return True
+            now = time.time()
+            if now < until:
+                return False
+            # Half open, this request is let through while the others keep
+            # failing fast until it is done.
+            self._openuntil[host] = now + self.cooldown
+            return True
+
+    def _succeeded(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._openuntil.pop(host, None)
+
+    def _failed(self, host):
+        with self._lock:
+            failures = self._failures[host] = self._failures.get(host, 0) + 1
+            if failures >= self.failures:
+                self._openuntil[host] = time.time() + self.cooldown
+
+    def delay(self, attempt, retryafter=None):
+        delay = random.uniform(0, min(self.maxbackoff, self.backoff * 2 ** attempt))
+        try:
+            delay = max(delay, min(self.maxbackoff, float(retryafter)))
+        except (TypeError, ValueError):
+            pass
+        return delay
+
+    def run(self, url, fn):
+        # Calls fn(), which downloads *url*, as often as the policy allows.
+        host = urlparse.urlparse(url)[1]
+        stats = defaultstats
+        for attempt in xrange(self.retries + 1):
+            if not self._allow(host):
+                if attempt:
+                    # Opened by the failures of this very request.
+                    raise error
+                if stats is not None:
+                    stats.count('circuit.open')
+                raise CircuitOpenError('Too many failed requests to %s, not trying again yet.' % host, url)
+            if attempt and stats is not None:
+                stats.count('retries')
+            if self.ratelimiter is not None:
+                self.ratelimiter.wait(url)
+            retryafter = None
+            try:
+                result = fn()
+            except urllib2.HTTPError, e:
+                if e.code not in self.retrystatuses:
+                    self._succeeded(host)
+                    if e.code in (404, 410):
+                        raise NotFoundError('Page not found. (%s)' % url, url, e.code)
+                    raise FetchError('HTTP error %d. (%s)' % (e.code, url), url, e.code)
+                if e.code in (429, 503):
+                    error = ThrottledError('Throttled by the server, HTTP error %d. (%s)' % (e.code, url), url, e.code)
+                    if stats is not None:
+                        stats.count('throttled')
+                else:
+                    error = FetchError('HTTP error %d. (%s)' % (e.code, url), url, e.code)
+                if e.hdrs is not None:
+                    retryafter = e.hdrs.get('retry-after')
+            except (httplib.HTTPException, socket.error, urllib2.URLError), e:
+                error = FetchError('Unable to connect to IMDB. (%s: %s)' % (url, e), url)
+            else:
+                self._succeeded(host)
+                return result
+            self._failed(host)
+            if attempt < self.retries:
+                time.sleep(self.delay(attempt, retryafter))
+        raise error
+
+
+class Stats(object):
+    # Collects timings, in seconds, and counters from every fetch and parse
+    # while it is set as defaultstats. Each hook is called with
+    # (type, name, value) for every event, type being 'timing' or 'count'.
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self.hooks = []
+        self._lock = threading.Lock()
+
+    def timing(self, name, seconds):
+        with self._lock:
+            entry = self.timings.get(name)
+            if entry is None:
+                self.timings[name] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                entry[2] = max(entry[2], seconds)
+        for hook in self.hooks:
+            hook('timing', name, seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        for hook in self.hooks:
+            hook('count', name, n)
+
+    def snapshot(self):
+        with self._lock:
+            return (dict(self.counters),
+                    dict((name, tuple(entry)) for name, entry in self.timings.items()))
+
+    def reset(self):
+        with self._lock:
+            self.timings = {}
+            self.counters = {}
+
+    def __str__(self):
+        counters, timings = self.snapshot()
+        lines = ['%-24s %8s %10s %10s' % ('timing', 'count', 'total ms', 'max ms')]
+        for name, (count, total, longest) in sorted(timings.items()):
+            lines.append('%-24s %8d %10.2f %10.2f' % (name, count, total * 1000, longest * 1000))
+        for name, value in sorted(counters.items()):
+            lines.append('%-24s %8d' % (name, value))
+        return '\n'.join(lines)
+
+
+def _metricname(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+def writeprometheus(stats, path, prefix='imdb'):
+    # Written to a temporary file first so that a collector never reads a
+    # half written file.
+    counters, timings = stats.snapshot()
+    lines = []
+    for name, value in sorted(counters.items()):
+        metric = '%s_%s_total' % (prefix, _metricname(name))
+        lines.append('# TYPE %s counter' % metric)
+        lines.append('%s %d' % (metric, value))
+    if timings:
+        metric = '%s_phase_seconds' % prefix
+        lines.append('# TYPE %s summary' % metric)
+        for name, (count, total, longest) in sorted(timings.items()):
+            lines.append('%s_count{phase="%s"} %d' % (metric, name, count))
+            lines.append('%s_sum{phase="%s"} %.6f' % (metric, name, total))
+        lines.append('# TYPE %s_max gauge' % metric)
+        for name, (count, total, longest) in sorted(timings.items()):
+            lines.append('%s_max{phase="%s"} %.6f' % (metric, name, longest))
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.rename(tmp, path)
+
+
+class StatsdHook(object):
+    # Sends every event to a StatsD server over UDP, add it to Stats.hooks.
+    # Timings are sent in milliseconds.
+    def __init__(self, host='127.0.0.1', port=8125, prefix='imdb'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, type, name, value):
+        if type == 'timing':
+            line = '%s.%s:%.3f|ms' % (self.prefix, name, value * 1000)
+        else:
+            line = '%s.%s:%d|c' % (self.prefix, name, value)
+        try:
+            self._socket.sendto(line, self.address)
+        except socket.error:
+            pass
+
+    def close(self):
+        self._socket.close()
+
+
+class Response(object):
+    # A file-like response body. *release* is called with True once the body
+    # has been read to the end, or with False if it is closed before that.
+    def __init__(self, url, status, headers, fp, release=None):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self._fp = fp
+        self._release = release
+
+    def read(self, size=-1):
+        data = self._fp.read() if size < 0 else self._fp.read(size)
+        if size < 0 or not data:
+            self._done(True)
+        return data
+
+    def close(self):
+        self._done(False)
+
+    def _done(self, complete):
+        if self._release is not None:
+            release, self._release = self._release, None
+            release(complete)
+
+
+class _GzipReader(object):
+    def __init__(self, fp):
+        self.fp = fp
+        self.buf = ''
+        self.decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def read(self, size=-1):
+        if size < 0:
+            data = self.buf + self.decoder.decompress(self.fp.read()) + self.decoder.flush()
+            self.buf = ''
+            return data
+        while len(self.buf) < size:
+            chunk = self.fp.read(8192)
+            if not chunk:
+                self.buf += self.decoder.flush()
+                break
+            self.buf += self.decoder.decompress(chunk)
+        data, self.buf = self.buf[:size], self.buf[size:]
+        return data
+
+
+class Transport(object):
+    # Everything downloaded goes through a transport. open() follows
+    # redirects, raises urllib2.HTTPError for error statuses and returns a
+    # Response.
+    def open(self, url, headers=None):
+        raise NotImplementedError
+
+
+class HTTPTransport(Transport):
+    # Keeps up to *maxidle* persistent HTTP/1.1 connections per host and asks
+    # for gzip compressed pages. All requests are sent to *proxy* if given.
+    useragent = 'imdb.py/%s' % __version__
+
+    def __init__(self, timeout=30, maxidle=4, proxy=None, maxredirects=5):
+        self.timeout = timeout
+        self.maxidle = maxidle
+        self.proxy = proxy
+        self.maxredirects = maxredirects
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, key):
+        scheme, host = key
+        if scheme == 'https':
+            conn = httplib.HTTPSConnection(host, timeout=self.timeout)
+        else:
+            conn = httplib.HTTPConnection(host, timeout=self.timeout)
+        stats = defaultstats
+        if stats is not None:
+            # Connect up front, including the DNS lookup, to time it apart
+            # from the request.
+            start = time.time()
+            conn.connect()
+            stats.timing('connect', time.time() - start)
+        return conn
+
+    def _getconnection(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _putconnection(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxidle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def open(self, url, headers=None):
+        for i in range(self.maxredirects + 1):
+            response, location = self._request(url, headers)
+            if location is None:
+                return response
+            if defaultstats is not None:
+                defaultstats.count('redirects')
+            url = urlparse.urljoin(url, location)
+        raise urllib2.HTTPError(url, 310, 'Too many redirects', {}, None)
+
+    def _request(self, url, headers):
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if self.proxy:
+            key = ('http', self.proxy)
+            target = url
+        else:
+            key = (scheme, netloc)
+            target = (path or '/') + ('?%s' % query if query else '')
+        requestheaders = {'Accept-Encoding': 'gzip', 'User-Agent': self.useragent}
+        requestheaders.update(headers or {})
+
+        conn, reused = self._getconnection(key)
+        try:
+            conn.request('GET', target, headers=requestheaders)
+            resp = conn.getresponse()
+        except (httplib.HTTPException, socket.error):
+            conn.close()
+            if not reused:
+                raise
+            # The server closed the idle connection, try once more on a new one.
+            if defaultstats is not None:
+                defaultstats.count('retries')
+            conn = self._connect(key)
+            conn.request('GET', target, headers=requestheaders)
+            resp = conn.getresponse()
+
+        responseheaders = dict(resp.getheaders())
+        keepalive = not resp.will_close
+        def release(complete):
+            if complete and keepalive:
+                self._putconnection(key, conn)
+            else:
+                conn.close()
+
+        if resp.status in (301, 302, 303, 307, 308) and 'location' in responseheaders:
+            resp.read()
+            release(True)
+            return None, responseheaders['location']
+        if resp.status >= 400:
+            resp.read()
+            release(True)
+            raise urllib2.HTTPError(url, resp.status, resp.reason, responseheaders, None)
+
+        fp = resp
+        if responseheaders.get('content-encoding') == 'gzip':
+            fp = _GzipReader(resp)
+        return Response(url, resp.status, responseheaders, fp, release), None
+
+
+class UrllibTransport(Transport):
+    # Downloads with urllib2, for example to use the proxies configured in the
+    # environment or a custom opener.
+    def __init__(self, opener=None):
+        self.opener = opener or urllib2.build_opener()
+
+    def open(self, url, headers=None):
+        try:
+            resp = self.opener.open(urllib2.Request(url, headers=headers or {}))
+        except urllib2.HTTPError, e:
+            if e.code != 304:
+                raise
+            return Response(url, 304, dict(e.info().items()), StringIO(''))
+        return Response(resp.geturl(), resp.getcode(), dict(resp.info().items()), resp)
+
+
+# Module wide cache used when no cache is passed to Title, Name, TitleSearch
+# or NameSearch.
+defaultcache = None
+
+# Transport used for every request that is not given one.
+defaulttransport = HTTPTransport()
+
+# Stats instance that fetches and parses are recorded in, None disables
+# instrumentation.
+defaultstats = None
+
+# FetchPolicy every download is made with.
+defaultpolicy = FetchPolicy()
+
+class Page(tuple):
+    # A downloaded page, unpacks to (finalurl, body). *status* is 304 and the
+    # body empty if the page has not changed since the validators passed to
+    # fetch() were handed out.
+    def __new__(cls, url, body, status=200, headers=None):
+        page = tuple.__new__(cls, (url, body))
+        page.status = status
+        page.headers = headers or {}
+        return page
+
+def fetch(url, kind, cache=None, ratelimit=None, transport=None, headers=None):
+    # Conditional requests, with If-None-Match or If-Modified-Since in
+    # *headers*, always go to the server.
+    stats = defaultstats
+    if cache is None:
+        cache = defaultcache
+    if cache is not None and not headers:
+        page = cache.get(url, kind)
+        if stats is not None:
+            stats.count('cache.miss' if page is None else 'cache.hit')
+        if page is not None:
+            return page if isinstance(page, Page) else Page(*page)
+    def download():
+        if ratelimit is not None:
+            ratelimit.wait(url)
+        if stats is None:
+            response = (transport or defaulttransport).open(url, headers)
+            return Page(response.url, response.read(), response.status, response.headers)
+        start = time.time()
+        response = (transport or defaulttransport).open(url, headers)
+        opened = time.time()
+        page = Page(response.url, response.read(), response.status, response.headers)
+        end = time.time()
+        stats.timing('request', opened - start)
+        stats.timing('transfer', end - opened)
+        stats.timing('fetch.%s' % kind, end - start)
+        stats.count('bytes', len(page[1]))
+        if page.status == 304:
+            stats.count('notmodified')
+        return page
+    page = defaultpolicy.run(url, download)
+    if cache is not None and page.status != 304:
+        cache.set(url, kind, page[0], page[1], page.headers)
+    return page
+
+def parsepage(page):
+    url, body = page
+    stats = defaultstats
+    if stats is None:
+        return document_fromstring(body, base_url=url)
+    start = time.time()
+    doc = document_fromstring(body, base_url=url)
+    stats.timing('parse', time.time() - start)
+    return doc
+
+def _held():
+    stats = defaultstats
+    if stats is not None:
+        stats.count('trees.held')
+    return time.time()
+
+def _released(held):
+    # Records how long a parsed page was held by a Title, Name or
+    # SearchResult, *held* being what _held() returned.
+    stats = defaultstats
+    if stats is not None:
+        stats.count('trees.released')
+        stats.timing('tree.retained', time.time() - held)
+
+def _infodivs(data):
+    stats = defaultstats
+    if stats is not None:
+        start = time.time()
+    infodivs = {}
+    for e in plan['infodivs'](data):
+        title = e.find('h5')
+        content = e.find('div')
+        if title is not None and title.text is not None and content is not None:
+            infodivs[asciionly.sub('', title.text).lower()] = content
+    for old, new in (('writer', 'writers'), ('director', 'directors')):
+        if old in infodivs:
+            infodivs[new] = infodivs[old]
+    if stats is not None:
+        stats.timing('infodivs', time.time() - start)
+    return infodivs
+
+def _runfield(obj, method):
+    # Calls one of the _parse* methods of a Title or Name, timed as
+    # field.<name> if instrumentation is enabled.
+    stats = defaultstats
+    if stats is None:
+        return getattr(obj, method)()
+    start = time.time()
+    getattr(obj, method)()
+    stats.timing('field.%s' % method[len('_parse'):], time.time() - start)
+
+def fetchstream(url, kind, cache=None, transport=None):
+    # Pages that are streamed are never stored in the cache since that would
+    # mean holding the whole page in memory.
+    if cache is None:
+        cache = defaultcache
+    if cache is not None:
+        page = cache.get(url, kind)
+        if page is not None:
+            return StringIO(page[1])
+    return defaultpolicy.run(url, lambda: (transport or defaulttransport).open(url))
+
+def iterpage(stream, tag, match):
+    # Yields every *tag* element for which match(element) is true once it has
+    # been parsed and frees it, and everything before it, when the caller is
+    # done with it.
+    for event, el in etree.iterparse(stream, events=('end',), tag=tag, html=True):
+        if match(el):
+            yield el
+            el.clear()
+            parent = el.getparent()
+            while el.getprevious() is not None:
+                del parent[0]
+
+def _hasclass(el, name):
+    return el is not None and name in el.get('class', '').split()
+
+def _castentry(cells):
+    name = None
+    characters = []
+    for cell in cells:
+        if _hasclass(cell, 'char'):
+            for c in cell.findall('.//a') or [cell]:
+                characterid = getid(c.get('href', ''))
+                charactername = c.text and ''.join(c.text.split('/')[0]).strip() or None
+                characters.append((charactername, characterid))
+        elif _hasclass(cell, 'nm') and name is None:
+            links = cell.findall('.//a')
+            c = links[0] if links else cell
+            nameid = c.get('href', None)
+            nameid = nameid.split('/')[2] if nameid else nameid
+            name = (c.text.strip(), nameid)
+    if name is not None:
+        return (name, characters)
+    return None
+
+def itercast(id, full=True, cache=None):
+    id = normalizeid(id, 'tt')
+    if full:
+        url, kind = 'http://www.imdb.com/title/%s/fullcredits' % id, 'fullcredits'
+    else:
+        url, kind = 'http://www.imdb.com/title/%s/' % id, 'title'
+    try:
+        stream = fetchstream(url, kind, cache)
+    except NotFoundError:
+        raise NotFoundError('Invalid IMDB id. (%s)' % id, url, 404)
+    for row in iterpage(stream, 'tr', lambda el: _hasclass(el.getparent(), 'cast')):
+        entry = _castentry(row)
+        if entry is not None:
+            yield entry
+
+def iterfilmography(id, cache=None, ids=False):
+    id = normalizeid(id, 'nm')
+    url = 'http://www.imdb.com/name/%s/filmorate' % id
+    try:
+        stream = fetchstream(url, 'filmorate', cache)
+    except NotFoundError:
+        raise NotFoundError('Invalid IMDB id. (%s)' % id, url, 404)
+    filmo = lambda el: any(_hasclass(a, 'filmo') for a in el.iterancestors())
+    for li in iterpage(stream, 'li', filmo):
+        for a in li.findall('a'):
+            if ids:
+                yield (a.text, getid(a.get('href', '')))
+            else:
+                yield a.text
+
+# Compact, immutable counterparts of Title, Name and SearchResult for keeping
+# large numbers of them in memory. Lists are stored as tuples.
+class TitleRecord(namedtuple('TitleRecord', 'id title year genres rating votes top directors writers '
+                             'plot fullplot tagline release runtime alsoknownas countries languages '
+                             'cast usercomment posterurl')):
+    __slots__ = ()
+
+class NameRecord(namedtuple('NameRecord', 'id name birthdate birthplace deathdate deathplace biography '
+                            'trivia awards alternatenames filmography photourl')):
+    __slots__ = ()
+
+# An edge found by Crawler, *label* being the name or title of the target.
+class Edge(namedtuple('Edge', 'source target kind label')):
+    __slots__ = ()
+
+class CastEntry(namedtuple('CastEntry', 'name id characters')):
+    __slots__ = ()
+
+class SearchHit(namedtuple('SearchHit', 'name id year extras')):
+    __slots__ = ()
+
+def _tuples(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_tuples(v) for v in value)
+    return value
+
+def _same(value):
+    return value
+
+class _Entity(object):
+    # What Title and Name share. Every field is filled in by a rule, one of
+    # the _parse* methods, listed in _fields for the main page and in
+    # _extrafields for pages of their own. Only the rules for the requested
+    # fields are run, and the info sections of the page are only collected
+    # once a rule asks for them.
+
+    def _setup(self, id, cache, lazy, fields, extras):
         self.data = None
+        self.cache = cache
+        self.lazy = lazy
+        self._sections = None
+        self._held = None
         if id is None:
             raise ValueError('Invalid IMDB id. (%s)' % id)
         elif isinstance(id, SearchResult):
             self.id = id.id
             if id.data is not None:
-                self.data = id.data
+                # The search result hands its page over, it is not kept alive
+                # by the result any longer.
+                self.data, id.data = id.data, None
+                self._held = id._held
+            pages = id._takepages()
+            if pages:
+                self.cache = _Prefetched(pages, cache)
         else:
-            if isinstance(id, int) and (0 <= id <= 9999999):
-                id = '%7s' % id
-            m = re.search(r'(?:tt)?(?P<id>\d{7})', id, re.I)
-            if m:
-                self.id = 'tt%s' % m.group('id')
+            self.id = normalizeid(id, self._prefix)
+        self.etag = None
+        self.lastmodified = None
+        self.changed = True
+        self._pending = None
+
+        if fields is None:
+            fields = self._fields.keys() + (self._extrafields.keys() if lazy else extras)
+        unknown = set(fields).difference(self._fields, self._extrafields)
+        if unknown:
+            raise ValueError('Unknown fields. (%s)' % ', '.join(sorted(unknown)))
+        self._wanted = frozenset(fields)
+
+    def __getstate__(self):
+        # Caches hold locks and connections, an unpickled instance uses
+        # defaultcache.
+        state = self.__dict__.copy()
+        state['cache'] = None
+        return state
+
+    def __getattr__(self, name):
+        method = self._fields.get(name) or self._extrafields.get(name)
+        if method is None or not self.__dict__.get('lazy'):
+            raise AttributeError(name)
+        if name in self._fields and self.data is None:
+            # Not read before close().
+            raise AttributeError(name)
+        self._parsefield(method)
+        return self.__dict__[name]
+
+    @property
+    def infodivs(self):
+        if self._sections is None:
+            self._sections = _infodivs(self.data)
+        return self._sections
+
+    def _infodiv(self, title, find=None):
+        try:
+            if not find:
+                for el in plan['more'](self.infodivs[title]):
+                    el.drop_tree()
+                return self.infodivs[title].text_content().replace('\n', '').strip()
             else:
-                raise ValueError('Invalid IMDB id. (%s)' % id)
+                return [x.text.replace('\n', '').strip() for x in self.infodivs[title].findall('.//%s' % find)]
+                
+        except:
+            if not find:
+                return None
+            else:
+                return []
+
+    def _photo(self, placeholder):
+        try:
+            url = plan['photo'](self.data)[0].get('src')
+        except (TypeError, KeyError, IndexError):
+            return None
+        if url is None or placeholder in url:
+            return None
+        return url
+
+    def _rules(self, fields):
+        # The rules filling fields, each once and in page order.
+        rules = OrderedDict()
+        for name, method in self._fields.items() + self._extrafields.items():
+            if name in fields:
+                rules[method] = None
+        return rules.keys()
+
+    def _load(self):
+        # Returns False if the page has not changed since it was last loaded.
+        if self.data is not None and self._pending is None:
+            data = self.data
+        else:
+            url = self._url % self.id
+            try:
+                page = fetch(url, self._kind, self.cache, headers=self._validators())
+            except NotFoundError:
+                raise NotFoundError('Invalid IMDB id. (%s)' % self.id, url, 404)
+            self.changed = page.status != 304
+            if not self.changed:
+                return False
+            self.etag = page.headers.get('etag')
+            self.lastmodified = page.headers.get('last-modified')
+            data = parsepage(page)
+            self._held = _held()
+        self.data = data
+
+        self._sections = None
+        self._pending = set(self._rules(self._wanted.intersection(self._fields)))
+        return True
+
+    def _release(self):
+        if self.data is not None and self._held is not None:
+            _released(self._held)
+        self._sections = None
+        self.data = None
+
+    def close(self):
+        # Drops the parsed page. In lazy mode attributes not read yet are not
+        # available any more.
+        self._pending = set()
+        self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _parsefield(self, method):
+        _runfield(self, method)
+        if method in self._pending:
+            self._pending.discard(method)
+            if not self._pending:
+                self._release()
+
+    def _validators(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.lastmodified:
+            headers['If-Modified-Since'] = self.lastmodified
+        return headers
+
+    def update(self):
+        if not self._load():
+            return
+        if self.lazy:
+            for name in self._wanted:
+                self.__dict__.pop(name, None)
+            return
+
+        for method in self._rules(self._wanted.intersection(self._fields)):
+            _runfield(self, method)
+        # Not needed for the fields on pages of their own.
+        self._release()
+        for method in self._rules(self._wanted.intersection(self._extrafields)):
+            _runfield(self, method)
+
+class Title(_Entity):
+    # Every attribute filled in by update() and the method that parses it.
+    _fields = OrderedDict([
+        ('title', '_parsetitle'),
+        ('year', '_parsetitle'),
+        ('directors', '_parsedirectors'),
+        ('writers', '_parsewriters'),
+        ('genres', '_parsegenres'),
+        ('alsoknownas', '_parsealsoknownas'),
+        ('rating', '_parserating'),
+        ('votes', '_parserating'),
+        ('top', '_parserating'),
+        ('plot', '_parseplot'),
+        ('tagline', '_parsetagline'),
+        ('release', '_parserelease'),
+        ('usercomment', '_parseusercomment'),
+        ('runtime', '_parseruntime'),
+        ('countries', '_parsecountries'),
+        ('languages', '_parselanguages'),
+        ('cast', '_parsecast'),
+        ('posterurl', '_parseposter'),
+    ])
+    # Fields that need a request of their own.
+    _extrafields = {'fullplot': '_parsefullplot'}
+    _prefix = 'tt'
+    _kind = 'title'
+    _url = 'http://www.imdb.com/title/%s/'
+    _record = TitleRecord
+
+    def __init__(self, id, fullplot = False, cache=None, lazy=False, fields=None):
+        self._fullplot = fullplot or (fields is not None and 'fullplot' in fields)
+        self._setup(id, cache, lazy, fields, ['fullplot'] if fullplot else [])
 
         self.title = None
         self.genres = []
@@ -46,8 +1113,8 @@ class Title(object):
         self.votes = None
         self.top = None
         self.directors = []
+        self.writers = []
         self.plot = None
-        self.fullplot = None
         self.tagline = None
         self.release = None
         self.runtime = None
@@ -60,150 +1127,168 @@ class Title(object):
         self.posterurl = None
         self.fullplot = fullplot
         self.update()
+        if not lazy:
+            self.cache = cache
     
-    def __repr__(self):
-        return "imdb.Title('%s'%s)" % (self.id, (', fullplot=True' if self.fullplot else ''))
+    @classmethod
+    def fromhtml(cls, html, id=None, url=None, pages=None, **kwargs):
+        return _fromhtml(cls, 'tt', 'title', html, id, url, pages, kwargs)
 
-    def _infodiv(self, title, find=None):
-        try:
-            if not find:
-                for el in self.infodivs[title].cssselect('.tn15more'):
-                    el.drop_tree()
-                return self.infodivs[title].text_content().replace('\n', '').strip()
-            else:
-                return [x.text.replace('\n', '').strip() for x in self.infodivs[title].findall('.//%s' % find)]
-                
-        except:
-            if not find:
-                return None
-            else:
-                return []
-
-
-    def update(self):
-        if self.data:
-            data = self.data
-        else:
-            try:
-                data = urllib2.urlopen('http://www.imdb.com/title/%s/' % self.id)
-            except urllib2.HTTPError, e:
-                raise ValueError('Invalid IMDB id. (%s)' % self.id)
-            data = parse(data).getroot()
-
-        self.infodivs = {}
-        for e in data.cssselect('#tn15content div.info'):
-            title = e.find('h5')
-            content = e.find('div')
-            if title is not None and title.text is not None and content is not None:
-                self.infodivs[asciionly.sub('', title.text).lower()] = content
-        for old, new in (('writer', 'writers'), ('director', 'directors')):
-            if old in self.infodivs:
-                self.infodivs[new] = self.infodivs[old]
+    def __repr__(self):
+        return "imdb.Title('%s'%s)" % (self.id, (', fullplot=True' if self._fullplot else ''))
 
+    def _parsetitle(self):
         try:
-            self.title = data.find('head').find('title').text
+            self.title = self.data.find('head').find('title').text
         except AttributeError:
             self.title = 'Unknown title'
 
+        self.year = None
         year = re.search(r'\((?P<year>\d{4})\)$', self.title)
         if year:
             self.year = int(year.group('year'))
             self.title = re.sub(r'\s\(\d{4}\)$', '', self.title)
         
+    def _parsedirectors(self):
+        self.directors = []
         if 'directors' in self.infodivs:
             self.directors = [(x.text, (x.get('href').split('/')[2] if x.get('href', None) else None)) for x in self.infodivs['directors'].findall('.//a')]
         
+    def _parsewriters(self):
+        self.writers = []
         if 'writers' in self.infodivs:
             self.writers = [(x.text, (x.get('href').split('/')[2] if x.get('href', None) else None), x.tail.split(')')[0].split('(')[-1]) for x in self.infodivs['writers'].findall('.//a') if x.get('class', '') != 'tn15more']
 
+    def _parsegenres(self):
+        self.genres = []
         if 'genre' in self.infodivs:
             self.genres = [x.text for x in self.infodivs['genre'].findall('.//a') if '/Sections' in x.attrib.get('href')]
+
+    def _parsealsoknownas(self):
+        self.alsoknownas = []
         if 'alsoknownas' in self.infodivs:
             self.alsoknownas = [self.infodivs['alsoknownas'].text.strip()]
             self.alsoknownas.extend([x.tail.strip() for x in self.infodivs['alsoknownas'].findall('.//br') if (hasattr(x, 'tail') and not x.tail is None)])
+
+    def _parserating(self):
+        self.rating = None
+        self.votes = None
+        self.top = None
         try:
-            rating = data.get_element_by_id('tn15rating')
+            rating = self.data.get_element_by_id('tn15rating')
             if rating is not None:
-                self.rating = Decimal(rating.cssselect('div .starbar-meta b')[0].text.replace('/10', ''))
-                self.votes = int(numonly.sub('', rating.cssselect('div .starbar-meta a')[0].text))
-                top = rating.cssselect('div .starbar-special a')
+                self.rating = Decimal(plan['rating'](rating)[0].text.replace('/10', ''))
+                self.votes = int(numonly.sub('', plan['votes'](rating)[0].text))
+                top = plan['top'](rating)
                 if top:
                     self.top = top[0].text
-        except (AttributeError, IndexError):
+        except (AttributeError, IndexError, KeyError):
             self.rating = None
             self.votes = None
             self.top = None
-        
 
-        self.plot = self._infodiv('plot').strip(' |')
+    def _parseplot(self):
+        self.plot = self._infodiv('plot')
+        if self.plot:
+            self.plot = self.plot.strip(' |')
+
+    def _parsetagline(self):
         self.tagline = self._infodiv('tagline')
+
+    def _parserelease(self):
+        self.release = None
         try:
             releasedate, releasecountry = self._infodiv('releasedate').split('(', 2)
-            self.release = (datetime.date(*datetime.datetime.strptime(releasedate.strip(), '%d %B %Y').timetuple()[:3]), releasecountry.strip(' )'))
-        except ValueError:
-            pass
+        except (ValueError, AttributeError):
+            return
+        releasedate = parsedate(releasedate)
+        if releasedate is not None:
+            self.release = (releasedate, releasecountry.strip(' )'))
+
+    def _parseusercomment(self):
         self.usercomment = self._infodiv('usercomments')
+
+    def _parseruntime(self):
         self.runtime = self._infodiv('runtime')
+
+    def _parsecountries(self):
         self.countries = self._infodiv('country', find='a')
+
+    def _parselanguages(self):
         self.languages = self._infodiv('language', find='a')
+
+    def _parsecast(self):
         self.cast = []
-        for x in data.cssselect('table.cast tr'):
-            characters = []
-            character = x.cssselect('.char a') or x.cssselect('.char')
-            if character:
-                for c in character:
-                    characterid = c.get('href', None)
-                    characterid = getid(characterid)
-                    charactername = c.text and ''.join(c.text.split('/')[0]).strip() or None
-                    characters.append((charactername, characterid))
-
-            name = x.cssselect('.nm a') or x.cssselect('.nm')
-            if name:
-                nameid = name[0].get('href', None)
-                nameid = nameid.split('/')[2] if nameid else nameid
-                name = name[0].text.strip()
-                self.cast.append(((name, nameid), characters))
-        
-        try:
-            self.posterurl = data.cssselect('div.photo img')[0].get('src')
-            if 'title_addposter' in self.posterurl:
-                self.posterurl = None
-        except (TypeError, KeyError):
-            self.posterurl = None
+        for row, cells in groupby(plan['cast'](self.data), lambda cell: cell.getparent()):
+            entry = _castentry(cells)
+            if entry is not None:
+                self.cast.append(entry)
 
-        if self.fullplot:
-            try:
-                data = urllib2.urlopen("http://www.imdb.com/title/%s/plotsummary" % self.id)
-                data = parse(data).getroot()
-                self.fullplot = data.cssselect('p.plotpar')[0].text.strip()
-            except (urllib2.HTTPError, AttributeError, IndexError):
-                pass
-        del self.infodivs
-        self.data = None
+    def record(self):
+        record = TitleRecord(*self._row())
+        return record._replace(cast=tuple(CastEntry(name, id, characters)
+                                          for (name, id), characters in record.cast))
 
-class Name(object):
-    def __init__(self, id):
-        self.data = None
-        if id is None:
-            raise ValueError('Invalid IMDB id. (%s)' % id)
-        elif isinstance(id, SearchResult):
-            self.id = id.id
-            if id.data is not None:
-                self.data = id.data
+    def _row(self, copy=_tuples):
+        # The fields of the record, *copy* turning the lists into tuples. The
+        # cast is left as ((name, id), characters) pairs.
+        if self._fullplot or not self.lazy:
+            fullplot = self.fullplot
         else:
-            if isinstance(id, int) and (0 <= id <= 9999999):
-                id = '%7s' % id
-            m = re.search(r"(?:nm)?(?P<id>\d{7})", id, re.I)
-            if m:
-                self.id = 'nm%s' % m.group("id")
-            else:
-                raise ValueError("Invalid IMDB id. (%s)" % id)
+            fullplot = self.__dict__.get('fullplot')
+        if not isinstance(fullplot, basestring):
+            fullplot = None
+        return (self.id, self.title, self.year, copy(self.genres), self.rating, self.votes,
+                self.top, copy(self.directors), copy(self.writers), self.plot, fullplot,
+                self.tagline, self.release, self.runtime, copy(self.alsoknownas),
+                copy(self.countries), copy(self.languages),
+                copy(self.cast),
+                self.usercomment, self.posterurl)
+
+    def itercast(self, full=True):
+        return itercast(self.id, full, self.cache)
+
+    def _parseposter(self):
+        self.posterurl = self._photo('title_addposter')
+
+    def _parsefullplot(self):
+        try:
+            data = fetch("http://www.imdb.com/title/%s/plotsummary" % self.id, 'plotsummary', self.cache)
+            data = parsepage(data)
+            self.fullplot = plan['plotpar'](data)[0].text.strip()
+        except (NotFoundError, AttributeError, IndexError):
+            if self.lazy:
+                self.fullplot = None
+
+class Name(_Entity):
+    # Every attribute filled in by update() and the method that parses it.
+    _fields = OrderedDict([
+        ('name', '_parsename'),
+        ('birthdate', '_parsebirth'),
+        ('birthplace', '_parsebirth'),
+        ('deathdate', '_parsedeath'),
+        ('deathplace', '_parsedeath'),
+        ('biography', '_parsebiography'),
+        ('trivia', '_parsetrivia'),
+        ('awards', '_parseawards'),
+        ('alternatenames', '_parsealternatenames'),
+        ('photourl', '_parsephoto'),
+    ])
+    # Fields that need a request of their own.
+    _extrafields = {'filmography': '_parsefilmography'}
+    _prefix = 'nm'
+    _kind = 'name'
+    _url = 'http://www.imdb.com/name/%s/'
+    _record = NameRecord
+
+    def __init__(self, id, cache=None, lazy=False, fields=None):
+        self._setup(id, cache, lazy, fields, ['filmography'])
 
         self.name = None
         self.birthdate = None
         self.birthplace = None
         self.deathdate = None
-        self.deathdate = None
+        self.deathplace = None
         self.biography = None
         self.trivia = None
         self.awards = None
@@ -211,51 +1296,25 @@ class Name(object):
         self.filmography = []
         self.photourl = None
         self.update()
+        if not lazy:
+            self.cache = cache
+
+    @classmethod
+    def fromhtml(cls, html, id=None, url=None, pages=None, **kwargs):
+        return _fromhtml(cls, 'nm', 'name', html, id, url, pages, kwargs)
 
     def __repr__(self):
         return "imdb.Name('%s')" % self.id
 
-    def _infodiv(self, title, find=None):
+    def _parsename(self):
         try:
-            if not find:
-                for el in self.infodivs[title].cssselect('.tn15more'):
-                    el.drop_tree()
-                return self.infodivs[title].text_content().replace('\n', '').strip()
-            else:
-                return [x.text.replace('\n', '').strip() for x in self.infodivs[title].findall('.//%s' % find)]
-                
-        except:
-            if not find:
-                return None
-            else:
-                return []
-
-
-    def update(self):
-        if self.data:
-            data = self.data
-        else:
-            try:
-                data = urllib2.urlopen('http://www.imdb.com/name/%s/' % self.id)
-            except urllib2.HTTPError:
-                raise ValueError("Invalid IMDB id. (%s)" % self.id)
-            data = parse(data).getroot()
-
-        self.infodivs = {}
-        for e in data.cssselect('#tn15content div.info'):
-            title = e.find('h5')
-            content = e.find('div')
-            if title is not None and title.text is not None and content is not None:
-                self.infodivs[asciionly.sub('', title.text).lower()] = content
-        for old, new in (('writer', 'writers'), ('director', 'directors')):
-            if old in self.infodivs:
-                self.infodivs[new] = self.infodivs[old]
-
-        try:
-            self.name = data.find('head').find('title').text
+            self.name = self.data.find('head').find('title').text
         except AttributeError:
             self.name = 'Unknown name'
         
+    def _parsebirth(self):
+        self.birthdate = None
+        self.birthplace = None
         if 'dateofbirth' in self.infodivs:
             birthattrs = self.infodivs['dateofbirth'].findall('.//a')
             if birthattrs:
@@ -270,21 +1329,17 @@ class Name(object):
                         birthyear = attr.text
                     elif 'bornwhere' in href:
                         self.birthplace = attr.text
-                if birthday and birthyear:
-                    try:
-                        self.birthdate = datetime.date(*datetime.datetime.strptime('%s %s' % (birthday, birthyear), '%d %B %Y').timetuple()[:3])
-                    except ValueError:
-                        pass
-                elif birthyear:
-                    try:
-                        self.birthdate = datetime.date(*datetime.datetime.strptime(birthyear, '%Y').timetuple()[:3])
-                    except ValueError:
-                        pass
+                if birthyear:
+                    self.birthdate = parsedate('%s %s' % (birthday, birthyear) if birthday else birthyear)
             
-        
+    def _parsedeath(self):
+        self.deathdate = None
+        self.deathplace = None
         if 'dateofdeath' in self.infodivs:
             deathattrs = self.infodivs['dateofdeath'].findall('.//a')[:2]
             if deathattrs:
+                deathday = None
+                deathyear = None
                 for attr in deathattrs:
                     href = attr.get('href').lower()
                     attr.text = attr.text.strip()
@@ -292,42 +1347,47 @@ class Name(object):
                         deathday = attr.text
                     elif 'diedinyear' in href:
                         deathyear = attr.text
-                        self.deatplace = attr.tail.strip(' ,\n')
-                if deathday and deathyear:
-                    try:
-                        self.deathdate = datetime.date(*datetime.datetime.strptime('%s %s' % (deathday, deathyear), '%d %B %Y').timetuple()[:3])
-                    except ValueError:
-                        pass
-                elif birthyear:
-                    try:
-                        self.deathdate = datetime.date(*datetime.datetime.strptime(deathyear, '%Y').timetuple()[:3])
-                    except ValueError:
-                        pass
+                        self.deathplace = attr.tail.strip(' ,\n') if attr.tail else None
+                if deathyear:
+                    self.deathdate = parsedate('%s %s' % (deathday, deathyear) if deathday else deathyear)
                         
+    def _parsebiography(self):
         self.biography = self._infodiv('minibiography')
+
+    def _parsetrivia(self):
         self.trivia = self._infodiv('trivia')
+
+    def _parseawards(self):
         self.awards = self._infodiv('awards')
         if self.awards:
             self.awards = re.sub(r'\s+', ' ', self.awards.strip())
+
+    def _parsealternatenames(self):
         self.alternatenames = self._infodiv('alternatenames')
  
-        try:
-            self.photourl =  data.cssselect('div.photo img')[0].get('src')
-            if "nophoto" in self.photourl:
-                self.photourl = None
-        except TypeError,KeyError:
-            self.photourl = None
+    def _parsephoto(self):
+        self.photourl = self._photo('nophoto')
 
-        
+    def record(self):
+        return NameRecord(*self._row())
+
+    def _row(self, copy=_tuples):
+        # See Title._row().
+        return (self.id, self.name, self.birthdate, self.birthplace, self.deathdate,
+                self.deathplace, self.biography, self.trivia, self.awards,
+                copy(self.alternatenames), copy(self.filmography), self.photourl)
+
+    def iterfilmography(self, ids=False):
+        return iterfilmography(self.id, self.cache, ids)
+
+    def _parsefilmography(self):
+        self.filmography = []
         try:
-            data = urllib2.urlopen('http://www.imdb.com/name/%s/filmorate' % self.id)
-            data = parse(data).getroot()
-            self.filmography = [x.text for x in data.cssselect('.filmo li > a')]
-        except urllib2.HTTPError:
+            data = fetch('http://www.imdb.com/name/%s/filmorate' % self.id, 'filmorate', self.cache)
+            data = parsepage(data)
+            self.filmography = [x.text for x in plan['filmography'](data)]
+        except NotFoundError:
             pass
-        
-        del self.infodivs
-        self.data = None
 
 class SearchResult(object):
     def __init__(self, name, id, data=None, **kwargs):
@@ -335,157 +1395,1475 @@ class SearchResult(object):
         self.id = id
         self.data = data
         self.kwargs = kwargs
+        self._pages = None
+        self._held = _held() if data is not None else None
         
     def __repr__(self):
         return repr('<%s%s [%s]>' % (self.name, (' %s' % self.kwargs.get('extras', None) if self.kwargs.get('extras', None) else ''), self.id))
 
     __str__ = __repr__        
 
+    def prefetch(self, pagelist, cache=None, pool=None):
+        self._pages = (pool or defaultpool).submit(_fetchpages, pagelist, self.id, cache)
+
+    def _takepages(self):
+        pages, self._pages = self._pages, None
+        if pages is not None:
+            try:
+                return pages.result()
+            except Exception:
+                pass
+        return None
+
+    def close(self):
+        if self.data is not None:
+            _released(self._held)
+        self.data = None
+        self._pages = None
+
+    def record(self):
+        return SearchHit(self.name, self.id, self.kwargs.get('year'), self.kwargs.get('extras'))
+
+
+def splitquery(query):
+    # Splits a query like 'The Matrix (1999)' into its title and year.
+    m = re.search(r'(?P<title>.+?)(?: \(?(?P<year>\d{4})(?:/[IV]*)?\)?)?$', query, re.I)
+    if m.group('year'):
+        return m.group('title').strip(), m.group('year').strip()
+    return query, None
+
+def normalizetitle(name):
+    name = findyear.sub('', name.lower()).strip()
+    if len(name) > 1 and name[0] == name[-1] == '"':
+        name = name[1:-1]
+    for article in ('the ', 'a ', 'an '):
+        if name.startswith(article):
+            return name[len(article):]
+    return name
+
+def rank(query, results, year=None):
+    # Scores every result in one pass. A name identical to the query scores
+    # 3, 'The <query>' 2, '"<query>"' 1 and one that only matches after
+    # dropping case, quotes, leading articles and year suffixes 0.5. A
+    # matching name from the requested year scores 10 more. Results are
+    # returned best first, ties keeping their original order.
+    query = query.lower().strip()
+    variants = {query: 3, 'the %s' % query: 2, '"%s"' % query: 1}
+    normalized = normalizetitle(query)
+    ranked = []
+    for result in results:
+        name = (result.name or '').lower()
+        score = variants.get(name, 0)
+        if not score and normalizetitle(name) == normalized:
+            score = 0.5
+        if score and year and result.kwargs.get('year') == year:
+            score += 10
+        ranked.append((score, result))
+    ranked.sort(key=lambda x: -x[0])
+    return ranked
+
+def _yearof(text):
+    year = findyear.search(text)
+    return year.group('year') if year else None
+
+def _searchimdb(kind, query, cache):
+    # The results of a title (tt) or name (nm) search on IMDb. Only title
+    # results have a year and extras.
+    page = fetch('http://www.imdb.com/find?s=%s&q=%s' % (kind, urllib2.quote(query.encode('latin-1'))), 'find', cache)
+    results = []
+    if "/find?s=" not in page[0]: # We've been redirected to the first result
+        data = parsepage(page)
+        try:
+            name = data.find('head').find('title').text
+        except AttributeError:
+            return results
+        kwargs = {'year': _yearof(name)} if kind == 'tt' else {}
+        results.append(SearchResult(name, getid(page[0]), data=data, **kwargs))
+        return results
+
+    for t in plan['results'](parsepage(page)):
+        i = None
+        if len(t) >= 1 and t[0].tag == 'a' and t[0].text and t[0].tail:
+            i = 0
+        elif len(t) >= 3 and t[2].tag == 'a' and t[2].text and t[2].tail:
+            i = 2
+        if not i is None:
+            kwargs = {'extras': t[i].tail.strip(), 'year': _yearof(t[i].tail)} if kind == 'tt' else {}
+            results.append(SearchResult(t[i].text.strip(), getid(t[i].attrib['href']), **kwargs))
+    return results
+
+class _Search(object):
+    # Closing a search drops the pages held by its results.
+    def close(self):
+        for result in self.results:
+            result.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
-class TitleSearch(object):
-    def __init__(self, query):
+class TitleSearch(_Search):
+    def __init__(self, query, cache=None, prefetch=0, index=None):
+        self.cache = cache
+        self.prefetch = prefetch
+        self.index = index
         self._query = query
         self.query = query
         self.query_year = None
         self.results = []
+        self.ranked = []
         self.bestmatch = None
         self.search()
 
+    @classmethod
+    def fromhtml(cls, html, query, url=None):
+        return _fromhtml(cls, None, 'find', html, query, url, None, {'index': False})
+
     def __repr__(self):
         return "imdb.TitleSearch(%r)" % self._query
         
     def search(self, query=None):
         self.query = query or self.query
         self._query = query or self._query
-        m = re.search(r'(?P<title>.+?)(?: \(?(?P<year>\d{4})(?:/[IV]*)?\)?)?$', self.query, re.I)
-        if m.group('year'):
-            self.query = m.group('title').strip()
-            self.query_year = m.group('year').strip()
+        self.query, self.query_year = splitquery(self.query)
+        self.results = []
+        # Only exact and all word matches count, a misspelled match might
+        # not be what IMDb would have found. An index of False is none at
+        # all, not even defaultindex.
+        index = defaultindex if self.index is None else self.index
+        if index is not None and index is not False:
+            self.results = index.titles(self.query, self.query_year, fuzzy=False)
+        if not self.results:
+            self._searchimdb()
 
-        try:
-            data = urllib2.urlopen('http://www.imdb.com/find?s=tt&q=%s' % urllib2.quote(self.query.encode('latin-1')))
-        except urllib2.HTTPError, e:
-            raise ValueError('Unable to connect to IMDB.')
-            
-        if "/find?s=" not in data.url: # We've been redirected to the first result
-            url = data.url
-            data = parse(data).getroot()
-            try:
-                title = data.find('head').find('title').text
-            except AttributeError:
-                pass
-            else:
-                year = findyear.search(title)
-                if year:
-                    year = year.group('year')
-                self.results.append(SearchResult(title, getid(url), data=data, year=year))
-                self.bestmatch = self.results[0]
-            
-            
-        else:
-            data = parse(data).getroot()
-            results = data.cssselect('td[valign="top"]')
-           
-            for t in results:
-                i = None
-                if len(t) >= 1 and t[0].tag == 'a' and t[0].text and t[0].tail:
-                    i = 0
-                elif len(t) >= 3 and t[2].tag == 'a' and t[2].text and t[2].tail:
-                    i = 2
-                if not i is None:
-                    year = findyear.search(t[i].tail)
-                    if year:
-                        year = year.group('year')
-                    self.results.append(SearchResult(t[i].text.strip(), getid(t[i].attrib['href']), extras=t[i].tail.strip(), year=year))
-
-            if self.results:
-                if self.query_year:
-                    for r in self.results:
-                        if r.name.lower() == self.query.lower() and self.query_year == r.year:
-                            self.bestmatch = r
-                            break
-
-                    if not self.bestmatch:
-                        for r in self.results:
-                            if r.name.lower() == ('the %s' % self.query.lower()) and self.query_year == r.year:
-                                self.bestmatch = r
-                                break
-
-                    if not self.bestmatch:
-                        for r in self.results:
-                            if r.name.lower() == ('"%s"' % self.query.lower()) and self.query_year == r.year:
-                                self.bestmatch = r
-                                break
-                
-                if not self.bestmatch:
-                    for r in self.results:
-                        if r.name.lower() == self.query.lower():
-                            self.bestmatch = r
-                            break
-
-                if not self.bestmatch:
-                    for r in self.results:
-                        if r.name.lower() == ('the %s' % self.query.lower()):
-                            self.bestmatch = r
-                            break
-
-                if not self.bestmatch:
-                    for r in self.results:
-                        if r.name.lower() == ('"%s"' % self.query.lower()):
-                            self.bestmatch = r
-                            break
-                        
-                if not self.bestmatch:
-                    self.bestmatch = self.results[0]
-                    
+        self.ranked = rank(self.query, self.results, self.query_year)
+        self.bestmatch = self.ranked[0][1] if self.ranked else None
+        for score, result in self.ranked[:self.prefetch]:
+            if result.data is None:
+                result.prefetch(_titlepages, self.cache)
 
-class NameSearch(object):
-    def __init__(self, query):
+    def _searchimdb(self):
+        self.results = _searchimdb('tt', self.query, self.cache)
+
+class NameSearch(_Search):
+    def __init__(self, query, cache=None, prefetch=0, index=None):
+        self.cache = cache
+        self.prefetch = prefetch
+        self.index = index
         self.query = query
         self.results = []
+        self.ranked = []
         self.bestmatch = None
         self.search()
         
+    @classmethod
+    def fromhtml(cls, html, query, url=None):
+        return _fromhtml(cls, None, 'find', html, query, url, None, {'index': False})
+
     def __repr__(self):
         return "imdb.NameSearch(%r)" % self.query
         
     def search(self, query=None):
         self.query = query or self.query
-        try:
-            data = urllib2.urlopen('http://www.imdb.com/find?s=nm&q=%s' % urllib2.quote(self.query.encode('latin-1')))
-        except urllib2.HTTPError, e:
-            raise ValueError('Unable to connect to IMDB.')
+        self.results = []
+        # See TitleSearch.search().
+        index = defaultindex if self.index is None else self.index
+        if index is not None and index is not False:
+            self.results = index.names(self.query, fuzzy=False)
+        if not self.results:
+            self._searchimdb()
+
+        self.ranked = rank(self.query, self.results)
+        self.bestmatch = self.ranked[0][1] if self.ranked else None
+        for score, result in self.ranked[:self.prefetch]:
+            if result.data is None:
+                result.prefetch(_namepages, self.cache)
+
+    def _searchimdb(self):
+        self.results = _searchimdb('nm', self.query, self.cache)
+
+
+_nonword = re.compile(r'\W+', re.U)
+_akacountry = re.compile(r'\s*\([^)]*\)$')
+
+def _indexkey(text):
+    return ' '.join(_nonword.sub(' ', normalizetitle(text)).split())
+
+def _replaced(tokens, positions, replacements):
+    words = list(tokens)
+    # From the end, a replacement may be two words.
+    for i, replacement in reversed(zip(positions, replacements)):
+        words[i:i + 1] = replacement
+    return words
+
+class _TextIndex(object):
+    # Every indexed name, such as a title or one of its other titles, is an
+    # entry. Postings are arrays of entry numbers.
+    alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    maxfuzzy = 100
+
+    def __init__(self):
+        self.entries = []
+        self.keys = set()
+        self.exact = {}
+        self.tokens = {}
+
+    def add(self, id, name, year, text):
+        key = _indexkey(text)
+        if not key or (id, key) in self.keys:
+            return
+        self.keys.add((id, key))
+        n = len(self.entries)
+        self.entries.append((id, name, year, key, text if text != name else None))
+        self.exact.setdefault(key, array('l')).append(n)
+        for token in set(key.split()):
+            self.tokens.setdefault(token, array('l')).append(n)
+
+    def _alltokens(self, key):
+        return self._intersect(key.split())
+
+    def _intersect(self, tokens):
+        postings = [self.tokens.get(token) for token in tokens]
+        if not all(postings):
+            return []
+        # Candidates come from the rarest token and are checked against the
+        # others.
+        postings.sort(key=len)
+        tokens = set(tokens)
+        return (n for n in postings[0] if tokens.issubset(self.entries[n][3].split()))
+
+    def _variants(self, token):
+        # Indexed words one typo, a wrong, missing, extra or swapped
+        # character, away from token. Also the pairs of indexed words token
+        # is when a space was left out or typed as another character.
+        tokens = self.tokens
+        letters = set(self.alphabet).union(token)
+        words = set()
+        pairs = []
+        for i in xrange(len(token) + 1):
+            head, tail = token[:i], token[i:]
+            words.update([head + c + tail for c in letters])
+            if tail:
+                words.add(head + tail[1:])
+                words.update([head + c + tail[1:] for c in letters])
+                if len(tail) > 1:
+                    words.add(head + tail[1] + tail[0] + tail[2:])
+            if head and tail and head in tokens:
+                if tail in tokens:
+                    pairs.append([head, tail])
+                if tail[1:] in tokens:
+                    pairs.append([head, tail[1:]])
+        words.discard(token)
+        return [[word] for word in sorted(filter(tokens.__contains__, words))] + pairs
+
+    def _corrected(self, tokens, i, variants):
+        # Entries with every word of tokens, the one at i replaced by one of
+        # its variants. Either the entries with the rarest of the other words
+        # are checked for a variant, or the entries with each variant for the
+        # other words, whichever are fewer.
+        others = tokens[:i] + tokens[i + 1:]
+        required = set(others)
+        anchor = min([self.tokens[token] for token in others], key=len) if others else None
+        postings = [min([self.tokens[word] for word in words], key=len) for words in variants]
+        if anchor is not None and len(anchor) <= sum(len(posting) for posting in postings):
+            singles = set(words[0] for words in variants if len(words) == 1)
+            pairs = [set(words) for words in variants if len(words) == 2]
+            for n in anchor:
+                words = set(self.entries[n][3].split())
+                if required <= words and (singles & words or any(pair <= words for pair in pairs)):
+                    yield n
+        else:
+            for words, posting in zip(variants, postings):
+                words = required.union(words)
+                for n in posting:
+                    if words.issubset(self.entries[n][3].split()):
+                        yield n
+
+    def _fuzzy(self, key):
+        # One typo in one word, or in two words for keys longer than eight
+        # characters. Words that are not indexed are always corrected, and
+        # only corrections to indexed words are tried.
+        tokens = key.split()
+        limit = 1 if len(key) <= 8 else 2
+        unknown = set(i for i, token in enumerate(tokens) if token not in self.tokens)
+        if len(unknown) > limit:
+            return []
+        variants = {}
+        found = OrderedDict()
+        for count in xrange(max(len(unknown), 1), limit + 1):
+            for positions in combinations(xrange(len(tokens)), count):
+                if not unknown.issubset(positions):
+                    continue
+                for i in positions:
+                    if i not in variants:
+                        variants[i] = self._variants(tokens[i])
+                if count == 1:
+                    matches = [self._corrected(tokens, positions[0], variants[positions[0]])]
+                else:
+                    matches = (self._intersect(_replaced(tokens, positions, replacements))
+                               for replacements in product(*[variants[i] for i in positions]))
+                for match in matches:
+                    for n in islice(match, self.maxfuzzy):
+                        found[n] = None
+                    if len(found) >= self.maxfuzzy:
+                        return found.keys()
+            if found:
+                break
+        return found.keys()
+
+    def search(self, query, year=None, limit=20, fuzzy=True):
+        key = _indexkey(query)
+        if not key:
+            return []
+        finds = [self.exact.get, self._alltokens]
+        if fuzzy:
+            finds.append(self._fuzzy)
+        for find in finds:
+            results = []
+            seen = set()
+            for n in find(key) or ():
+                id, name, entryyear, key_, aka = self.entries[n]
+                if id in seen or (year and entryyear != year):
+                    continue
+                seen.add(id)
+                kwargs = {'year': entryyear}
+                if aka is not None:
+                    kwargs['extras'] = 'aka "%s"' % aka
+                results.append(SearchResult(name, id, **kwargs))
+                if len(results) == limit:
+                    break
+            if results:
+                return results
+        return []
+
+
+class SearchIndex(object):
+    # Answers title and name searches from titles and names already
+    # downloaded. Titles are found by title and other titles, names by name.
+    def __init__(self, items=()):
+        self._titles = _TextIndex()
+        self._names = _TextIndex()
+        self._lock = threading.Lock()
+        for item in items:
+            self.add(item)
+
+    @classmethod
+    def fromstore(cls, store):
+        index = cls(store.titles())
+        for record in store.names():
+            index.add(record)
+        return index
+
+    def __len__(self):
+        return len(self._titles.entries) + len(self._names.entries)
+
+    def add(self, item):
+        if not isinstance(item, tuple):
+            item = item.record()
+        with self._lock:
+            if isinstance(item, TitleRecord):
+                year = str(item.year) if item.year else None
+                self._titles.add(item.id, item.title, year, item.title or '')
+                for aka in item.alsoknownas or ():
+                    self._titles.add(item.id, item.title, year, _akacountry.sub('', aka))
+            elif isinstance(item, NameRecord):
+                self._names.add(item.id, item.name, None, item.name or '')
+                for alternatename in (item.alternatenames or '').split('|'):
+                    self._names.add(item.id, item.name, None, alternatename.strip())
+            else:
+                raise ValueError('Only titles and names can be indexed.')
+
+    def titles(self, query, year=None, limit=20, fuzzy=True):
+        return self._titles.search(query, year, limit, fuzzy)
+
+    def names(self, query, limit=20, fuzzy=True):
+        return self._names.search(query, None, limit, fuzzy)
+
+# SearchIndex consulted by every TitleSearch and NameSearch not given an
+# index of its own, before searching IMDb.
+defaultindex = None
             
-        if "/find?s=" not in data.url: # We've been redirected to the first result
-            url = data.url
-            data = parse(data).getroot()
+class SearchCache(object):
+    # Shares searches between callers. Queries are reduced to their title and
+    # year, identical searches running at the same time make a single request
+    # and finished searches are kept for *ttl* seconds.
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def titlesearch(self, query, **kwargs):
+        title, year = splitquery(query)
+        return self._search(TitleSearch, ('tt', ' '.join(title.lower().split()), year), query, kwargs)
+
+    def namesearch(self, query, **kwargs):
+        return self._search(NameSearch, ('nm', ' '.join(query.lower().split()), None), query, kwargs)
+
+    def _search(self, cls, key, query, kwargs):
+        # Searches made with a different cache, index or prefetch are not the
+        # same search.
+        key += tuple(sorted(kwargs.items()))
+        owner = False
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and (self.ttl is None or time.time() - entry[0] <= self.ttl):
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.waits += 1
+            else:
+                self.misses += 1
+                future = self._inflight[key] = Future()
+                owner = True
+        if not owner:
+            return future.result()
+
+        try:
+            search = cls(query, **kwargs)
+        except Exception, e:
+            with self._lock:
+                del self._inflight[key]
+            future._finish(error=e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            self._entries[key] = (time.time(), search)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        future._finish(search)
+        return search
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'waits': self.waits}
+
+
+class Store(object):
+    # Keeps title and name records in a SQLite database, indexed by year,
+    # genre, director and cast member.
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS titles (id TEXT PRIMARY KEY, year INTEGER, record BLOB);
+        CREATE INDEX IF NOT EXISTS titles_year ON titles (year);
+        CREATE TABLE IF NOT EXISTS title_genres (title TEXT, genre TEXT);
+        CREATE INDEX IF NOT EXISTS title_genres_title ON title_genres (title);
+        CREATE INDEX IF NOT EXISTS title_genres_genre ON title_genres (genre);
+        CREATE TABLE IF NOT EXISTS title_directors (title TEXT, name TEXT);
+        CREATE INDEX IF NOT EXISTS title_directors_title ON title_directors (title);
+        CREATE INDEX IF NOT EXISTS title_directors_name ON title_directors (name);
+        CREATE TABLE IF NOT EXISTS title_cast (title TEXT, name TEXT);
+        CREATE INDEX IF NOT EXISTS title_cast_title ON title_cast (title);
+        CREATE INDEX IF NOT EXISTS title_cast_name ON title_cast (name);
+        CREATE TABLE IF NOT EXISTS names (id TEXT PRIMARY KEY, record BLOB);
+    '''
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.text_factory = str
+        self._lock = threading.Lock()
+        self._db.executescript(self._schema)
+
+    def close(self):
+        self._db.close()
+
+    def save(self, item):
+        self.savemany([item])
+
+    def savemany(self, items):
+        with self._lock:
+            with self._db:
+                for item in items:
+                    if isinstance(item, (Title, Name)):
+                        item = item.record()
+                    if isinstance(item, TitleRecord):
+                        self._savetitle(item)
+                    elif isinstance(item, NameRecord):
+                        self._savename(item)
+                    else:
+                        raise TypeError('Can not store %r' % (item,))
+
+    def _savetitle(self, record):
+        db = self._db
+        db.execute('INSERT OR REPLACE INTO titles (id, year, record) VALUES (?, ?, ?)',
+                   (record.id, record.year, self._dump(record)))
+        for table in ('title_genres', 'title_directors', 'title_cast'):
+            db.execute('DELETE FROM %s WHERE title = ?' % table, (record.id,))
+        db.executemany('INSERT INTO title_genres (title, genre) VALUES (?, ?)',
+                       [(record.id, genre) for genre in set(record.genres)])
+        db.executemany('INSERT INTO title_directors (title, name) VALUES (?, ?)',
+                       [(record.id, id) for id in set(id for name, id in record.directors) if id])
+        db.executemany('INSERT INTO title_cast (title, name) VALUES (?, ?)',
+                       [(record.id, id) for id in set(entry.id for entry in record.cast) if id])
+
+    def _savename(self, record):
+        self._db.execute('INSERT OR REPLACE INTO names (id, record) VALUES (?, ?)',
+                         (record.id, self._dump(record)))
+
+    def _dump(self, record):
+        return sqlite3.Binary(cPickle.dumps(tuple(record), cPickle.HIGHEST_PROTOCOL))
+
+    def _titlerecord(self, blob):
+        record = TitleRecord(*cPickle.loads(str(blob)))
+        return record._replace(cast=tuple(CastEntry(*entry) for entry in record.cast))
+
+    def title(self, id):
+        with self._lock:
+            row = self._db.execute('SELECT record FROM titles WHERE id = ?', (normalizeid(id, 'tt'),)).fetchone()
+        if row is not None:
+            return self._titlerecord(row[0])
+        return None
+
+    def name(self, id):
+        with self._lock:
+            row = self._db.execute('SELECT record FROM names WHERE id = ?', (normalizeid(id, 'nm'),)).fetchone()
+        if row is not None:
+            return NameRecord(*cPickle.loads(str(row[0])))
+        return None
+
+    def titles(self, year=None, genre=None, director=None, cast=None):
+        rows = self._query('record', year, genre, director, cast)
+        return [self._titlerecord(row[0]) for row in rows]
+
+    def titleids(self, year=None, genre=None, director=None, cast=None):
+        return [row[0] for row in self._query('id', year, genre, director, cast)]
+
+    def _query(self, column, year, genre, director, cast):
+        query = ['SELECT %s FROM titles WHERE 1' % column]
+        args = []
+        if year is not None:
+            query.append('AND year = ?')
+            args.append(year)
+        for value, table, column in ((genre, 'title_genres', 'genre'),
+                                     (director and normalizeid(director, 'nm'), 'title_directors', 'name'),
+                                     (cast and normalizeid(cast, 'nm'), 'title_cast', 'name')):
+            if value is not None:
+                query.append('AND id IN (SELECT title FROM %s WHERE %s = ?)' % (table, column))
+                args.append(value)
+        with self._lock:
+            return self._db.execute(' '.join(query), args).fetchall()
+
+    def names(self):
+        with self._lock:
+            rows = self._db.execute('SELECT record FROM names').fetchall()
+        return [NameRecord(*cPickle.loads(str(row[0]))) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return sum(self._db.execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]
+                       for table in ('titles', 'names'))
+
+
+# The column types of TitleRecord and NameRecord fields in Columns.
+_columntypes = {
+    TitleRecord: [('id', 'str'), ('title', 'str'), ('year', 'int'), ('genres', 'list'),
+                  ('rating', 'decimal'), ('votes', 'int'), ('top', 'str'), ('directors', 'people'),
+                  ('writers', 'writers'), ('plot', 'str'), ('fullplot', 'str'), ('tagline', 'str'),
+                  ('release', 'release'), ('runtime', 'str'), ('alsoknownas', 'list'),
+                  ('countries', 'list'), ('languages', 'list'), ('cast', 'cast'),
+                  ('usercomment', 'str'), ('posterurl', 'str')],
+    NameRecord: [('id', 'str'), ('name', 'str'), ('birthdate', 'date'), ('birthplace', 'str'),
+                 ('deathdate', 'date'), ('deathplace', 'str'), ('biography', 'str'),
+                 ('trivia', 'str'), ('awards', 'str'), ('alternatenames', 'str'),
+                 ('filmography', 'list'), ('photourl', 'str')],
+}
+
+_epoch = datetime.date(1970, 1, 1)
+
+class Columns(object):
+    # Column-wise copy of many titles or names. Every column is a flat list
+    # or array: numbers and dates are int64 arrays with a '.valid' bytearray
+    # beside them, ratings in tenths, dates in days since 1970-01-01, and
+    # list fields are an '.offsets' array into their values.
+    ratingscale = 1
+
+    def __init__(self, items=()):
+        self.data = OrderedDict()
+        self.length = 0
+        self.record = None
+        self.fields = []
+        self.extend(items)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def _setup(self, record):
+        # Builds one function per field adding a whole column of values.
+        self.record = record
+        self.fields = _columntypes[record]
+        self._encoders = []
+        data = self.data
+        scale = self.ratingscale
+
+        def strings(*names):
+            for name in names:
+                data[name] = []
+            return [data[name].extend for name in names]
+        def numbers(name, convert=None):
+            column = data[name] = array('l')
+            valid = data[name + '.valid'] = bytearray()
+            def encode(values):
+                if convert is None:
+                    column.extend([0 if v is None else v for v in values])
+                else:
+                    column.extend([0 if v is None else convert(v) for v in values])
+                valid.extend([v is not None for v in values])
+            return encode
+        def offsets(name):
+            column = data[name + '.offsets'] = array('l', [0])
+            def end(counts):
+                total = column[-1]
+                for count in counts:
+                    total += count
+                    column.append(total)
+            return end
+        def lengths(values):
+            return [len(v) if v else 0 for v in values]
+        def entries(values):
+            return [entry for value in values if value for entry in value]
+        def days(value):
+            return (value - _epoch).days
+        def tenths(value):
+            return int(value.scaleb(scale))
+
+        for name, kind in self.fields:
+            if kind == 'str':
+                encode = strings(name)[0]
+            elif kind == 'int':
+                encode = numbers(name)
+            elif kind == 'decimal':
+                encode = numbers(name, tenths)
+            elif kind == 'date':
+                encode = numbers(name, days)
+            elif kind == 'list':
+                def encode(values, extend=strings(name)[0], end=offsets(name)):
+                    extend(entries(values))
+                    end(lengths(values))
+            elif kind in ('people', 'writers'):
+                subfields = ('name', 'id', 'role') if kind == 'writers' else ('name', 'id')
+                def encode(values, extends=strings(*['%s.%s' % (name, f) for f in subfields]),
+                           end=offsets(name)):
+                    found = entries(values)
+                    for i, extend in enumerate(extends):
+                        extend([entry[i] if len(entry) > i else None for entry in found])
+                    end(lengths(values))
+            elif kind == 'release':
+                def encode(values, date=numbers(name + '.date', days), country=strings(name + '.country')[0]):
+                    date([value[0] if value else None for value in values])
+                    country([value[1] if value else None for value in values])
+            elif kind == 'cast':
+                def encode(values, extends=strings(name + '.name', name + '.id', name + '.characters.name',
+                                                   name + '.characters.id'),
+                           end=offsets(name), endcharacters=offsets(name + '.characters')):
+                    # Records hold CastEntry tuples, titles hand over their
+                    # ((name, id), characters) pairs.
+                    found = entries(values)
+                    if found and found[0].__class__ is CastEntry:
+                        extends[0]([entry[0] for entry in found])
+                        extends[1]([entry[1] for entry in found])
+                        found = [entry[2] for entry in found]
+                    else:
+                        extends[0]([entry[0][0] for entry in found])
+                        extends[1]([entry[0][1] for entry in found])
+                        found = [entry[1] for entry in found]
+                    characters = entries(found)
+                    extends[2]([character for character, characterid in characters])
+                    extends[3]([characterid for character, characterid in characters])
+                    endcharacters(lengths(found))
+                    end(lengths(values))
+            self._encoders.append(encode)
+
+    def append(self, item):
+        self.extend((item,))
+
+    def extend(self, items):
+        # Titles and names give their fields without the copies record()
+        # makes, with the cast as ((name, id), characters) pairs. Every run of
+        # records, or of titles and names, is encoded a column at a time.
+        for isrecord, run in groupby(items, lambda item: isinstance(item, tuple)):
+            rows = []
+            for item in run:
+                if isrecord:
+                    record = type(item)
+                else:
+                    record, item = item._record, item._row(_same)
+                if self.record is None:
+                    self._setup(record)
+                elif not issubclass(record, self.record):
+                    raise ValueError('Can not mix %s and %s.' % (self.record.__name__, record.__name__))
+                rows.append(item)
+            for encode, values in zip(self._encoders, zip(*rows)):
+                encode(values)
+            self.length += len(rows)
+
+    def tonumpy(self):
+        # Needs numpy. Numbers are shared with the arrays, not copied.
+        import numpy
+        columns = OrderedDict()
+        for name, values in self.data.items():
+            if isinstance(values, array):
+                columns[name] = numpy.frombuffer(values, dtype='i%d' % values.itemsize)
+            elif isinstance(values, bytearray):
+                columns[name] = numpy.frombuffer(values, dtype=numpy.bool_)
+            else:
+                columns[name] = numpy.array(values, dtype=object)
+        return columns
+
+    def toarrow(self):
+        # Needs pyarrow.
+        import pyarrow
+        data = self.data
+        def strings(name):
+            return pyarrow.array(data[name], pyarrow.string())
+        def number(name, type):
+            values = [v if ok else None for v, ok in zip(data[name], data[name + '.valid'])]
+            return pyarrow.array(values, pyarrow.int64()).cast(type)
+        def listof(name, values):
+            return pyarrow.ListArray.from_arrays(pyarrow.array(data[name + '.offsets'], pyarrow.int32()), values)
+        def struct(name, subfields):
+            return pyarrow.StructArray.from_arrays([strings('%s.%s' % (name, f)) for f in subfields], list(subfields))
+        columns = []
+        for name, kind in self.fields:
+            if kind == 'str':
+                column = strings(name)
+            elif kind == 'int':
+                column = number(name, pyarrow.int64())
+            elif kind == 'decimal':
+                scale = self.ratingscale
+                column = pyarrow.array([Decimal(v).scaleb(-scale) if ok else None
+                                        for v, ok in zip(data[name], data[name + '.valid'])],
+                                       pyarrow.decimal128(3 + scale, scale))
+            elif kind == 'date':
+                column = number(name, pyarrow.int32()).cast(pyarrow.date32())
+            elif kind == 'list':
+                column = listof(name, strings(name))
+            elif kind == 'people':
+                column = listof(name, struct(name, ('name', 'id')))
+            elif kind == 'writers':
+                column = listof(name, struct(name, ('name', 'id', 'role')))
+            elif kind == 'release':
+                column = pyarrow.StructArray.from_arrays(
+                    [number(name + '.date', pyarrow.int32()).cast(pyarrow.date32()), strings(name + '.country')],
+                    ['date', 'country'])
+            elif kind == 'cast':
+                characters = listof(name + '.characters', struct(name + '.characters', ('name', 'id')))
+                column = listof(name, pyarrow.StructArray.from_arrays(
+                    [strings(name + '.name'), strings(name + '.id'), characters], ['name', 'id', 'characters']))
+            columns.append(column)
+        return pyarrow.Table.from_arrays(columns, [name for name, kind in self.fields])
+
+    def writearrow(self, path):
+        import pyarrow
+        table = self.toarrow()
+        with pyarrow.OSFile(path, 'wb') as f:
+            writer = pyarrow.RecordBatchFileWriter(f, table.schema)
+            writer.write_table(table)
+            writer.close()
+
+
+# The pages Title and Name read when created with the same arguments. As in
+# _Entity._setup() *fields* overrides the default fields, and in lazy mode
+# pages of their own are only downloaded once their field is read.
+def _titlepages(id, fullplot=False, lazy=False, fields=None, **kwargs):
+    pages = [('http://www.imdb.com/title/%s/' % id, 'title')]
+    if fields is None:
+        fields = ['fullplot'] if fullplot else []
+    if not lazy and 'fullplot' in fields:
+        pages.append(('http://www.imdb.com/title/%s/plotsummary' % id, 'plotsummary'))
+    return pages
+
+def _namepages(id, lazy=False, fields=None, **kwargs):
+    pages = [('http://www.imdb.com/name/%s/' % id, 'name')]
+    if fields is None:
+        fields = ['filmography']
+    if not lazy and 'filmography' in fields:
+        pages.append(('http://www.imdb.com/name/%s/filmorate' % id, 'filmorate'))
+    return pages
+
+def _fetchpages(pagelist, id, cache=None, ratelimit=None, **kwargs):
+    # Downloads every page the object with the given id will need. Only a
+    # missing main page is an error.
+    pages = {}
+    for n, (url, kind) in enumerate(pagelist(id, **kwargs)):
+        try:
+            pages[url] = fetch(url, kind, cache, ratelimit)
+        except NotFoundError:
+            if n == 0:
+                raise
+    return pages
+
+def _batch(cls, prefix, pagelist, ids, workers, ordered, rate, cache, kwargs):
+    ratelimit = RateLimiter(rate) if rate else None
+    objcache = cache
+    if cache is None:
+        cache = defaultcache
+    jobs = Queue.Queue()
+    done = Queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+    for job in enumerate(ids):
+        jobs.put(job)
+    count = len(ids)
+
+    def worker():
+        while not stop.is_set():
             try:
-                title = data.find('head').find('title').text
-            except AttributeError:
-                pass
+                index, id = jobs.get_nowait()
+            except Queue.Empty:
+                return
+            pages = {}
+            error = None
+            try:
+                id = normalizeid(id, prefix)
+                pages = _fetchpages(pagelist, id, cache, ratelimit, **kwargs)
+            except Exception, e:
+                error = e
+            while not stop.is_set():
+                try:
+                    done.put((index, id, pages, error), timeout=0.1)
+                    break
+                except Queue.Full:
+                    pass
+
+    threads = [threading.Thread(target=worker) for i in range(min(workers, count))]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    # Parsing happens here, in the consuming thread, while the workers keep
+    # downloading.
+    def results():
+        pending = {}
+        nextindex = 0
+        try:
+            for i in range(count):
+                index, id, pages, error = done.get()
+                result = None
+                if error is None:
+                    try:
+                        result = cls(id, cache=_Prefetched(pages, cache), **kwargs)
+                        if not kwargs.get('lazy'):
+                            # The prefetched pages are not needed any more,
+                            # update() downloads again.
+                            result.cache = objcache
+                    except Exception, e:
+                        error = e
+                if not ordered:
+                    yield (id, result, error)
+                    continue
+                pending[index] = (id, result, error)
+                while nextindex in pending:
+                    yield pending.pop(nextindex)
+                    nextindex += 1
+        finally:
+            stop.set()
+    return results()
+
+def fetchtitles(ids, workers=4, ordered=True, rate=None, cache=None, **kwargs):
+    return _batch(Title, 'tt', _titlepages, list(ids), workers, ordered, rate, cache, kwargs)
+
+def fetchnames(ids, workers=4, ordered=True, rate=None, cache=None, **kwargs):
+    return _batch(Name, 'nm', _namepages, list(ids), workers, ordered, rate, cache, kwargs)
+
+
+def _parseinit():
+    global defaultcache, defaultindex, defaultstats
+    defaultcache = None
+    defaultindex = None
+    defaultstats = None
+
+def _fromhtml(cls, prefix, mainkind, html, key, url, pages, kwargs):
+    if hasattr(html, 'read'):
+        html = html.read()
+    if prefix is not None:
+        key = key or getid(url or '')
+        if key is None:
+            raise ValueError('Unable to tell the IMDB id of the page.')
+        key = normalizeid(key, prefix)
+    obj = cls(key, cache=_Pages(pages or {}, (url, html), mainkind), **kwargs)
+    if not kwargs.get('lazy'):
+        # Not needed any more, update() downloads from IMDb again.
+        obj.cache = None
+    return obj
+
+def _parsechunk(jobs):
+    results = []
+    for cls, mainkind, key, pages, kwargs in jobs:
+        main = None
+        if isinstance(pages, basestring):
+            main, pages = (None, pages), {}
+        elif isinstance(pages, tuple):
+            main, pages = pages, {}
+        record = None
+        error = None
+        try:
+            obj = cls(key, cache=_Pages(pages, main, mainkind), **kwargs)
+            if isinstance(obj, (TitleSearch, NameSearch)):
+                record = tuple(r.record() for r in obj.results)
             else:
-                self.results.append(SearchResult(title, getid(url), data=data))
-                self.bestmatch = self.results[0]
-            
-            
+                record = obj.record()
+        except Exception, e:
+            error = e
+        results.append((key, record, error))
+    return results
+
+def _parallel(cls, mainkind, items, processes, chunksize, ordered, kwargs):
+    # Input is handed to the pool a window at a time, Pool.imap would
+    # otherwise read all of it up front.
+    processes = processes or multiprocessing.cpu_count()
+    jobs = ((cls, mainkind, key, pages, kwargs) for key, pages in items)
+    def chunks():
+        while True:
+            chunk = list(islice(jobs, chunksize))
+            if not chunk:
+                return
+            yield chunk
+    pool = multiprocessing.Pool(processes, _parseinit)
+    try:
+        window = chunks()
+        while True:
+            batch = list(islice(window, processes * 4))
+            if not batch:
+                break
+            imap = pool.imap if ordered else pool.imap_unordered
+            for results in imap(_parsechunk, batch):
+                for result in results:
+                    yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+def parsetitles(items, processes=None, chunksize=8, ordered=True, **kwargs):
+    return _parallel(Title, 'title', items, processes, chunksize, ordered, kwargs)
+
+def parsenames(items, processes=None, chunksize=8, ordered=True, **kwargs):
+    return _parallel(Name, 'name', items, processes, chunksize, ordered, kwargs)
+
+def parsetitlesearches(items, processes=None, chunksize=8, ordered=True):
+    return _parallel(TitleSearch, 'find', items, processes, chunksize, ordered, {'index': False})
+
+def parsenamesearches(items, processes=None, chunksize=8, ordered=True):
+    return _parallel(NameSearch, 'find', items, processes, chunksize, ordered, {'index': False})
+
+
+def _iterdirectory(path):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            filename = os.path.join(root, filename)
+            with open(filename, 'rb') as f:
+                yield (filename, f.read())
+
+def _itertar(path):
+    # Read as a stream, members are never seeked back to.
+    tar = tarfile.open(path, 'r|*')
+    try:
+        for member in tar:
+            if member.isfile():
+                yield (member.name, tar.extractfile(member).read())
+            # TarFile remembers every member it has seen.
+            tar.members = []
+    finally:
+        tar.close()
+
+def _httpbody(block):
+    head, sep, body = block.partition('\r\n\r\n')
+    lines = head.split('\r\n')
+    if len(lines[0].split()) < 2 or lines[0].split()[1] != '200':
+        return None
+    headers = {}
+    for line in lines[1:]:
+        key, sep, value = line.partition(':')
+        headers[key.strip().lower()] = value.strip().lower()
+    if headers.get('transfer-encoding') == 'chunked':
+        chunks = []
+        while body:
+            size, sep, body = body.partition('\r\n')
+            size = int(size.split(';')[0] or '0', 16)
+            if not size:
+                break
+            chunks.append(body[:size])
+            body = body[size + 2:]
+        body = ''.join(chunks)
+    if headers.get('content-encoding') == 'gzip':
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    return body
+
+def _iterwarc(path):
+    f = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+    try:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            headers = {}
+            for line in iter(f.readline, ''):
+                if not line.strip():
+                    break
+                key, sep, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+            block = f.read(int(headers.get('content-length', 0)))
+            if headers.get('warc-type') != 'response' or not block.startswith('HTTP/'):
+                continue
+            body = _httpbody(block)
+            if body is not None:
+                yield (headers.get('warc-target-uri', '').strip('<>'), body)
+    finally:
+        f.close()
+
+def iterarchive(path):
+    # Yields (name, body) for every page, name being the url of a WARC record
+    # or the path of a file, one page at a time.
+    if os.path.isdir(path):
+        return _iterdirectory(path)
+    if path.endswith(('.warc', '.warc.gz')):
+        return _iterwarc(path)
+    return _itertar(path)
+
+def _archiveurl(name):
+    # The canonical url of a saved page, worked out from the id and the page
+    # kind in its url or file name.
+    id = getid(name)
+    if id is None or '/find' in name:
+        return None
+    id = id.lower()
+    if id.startswith('tt'):
+        url = 'http://www.imdb.com/title/%s/' % id
+    elif id.startswith('nm'):
+        url = 'http://www.imdb.com/name/%s/' % id
+    else:
+        return None
+    for kind in ('plotsummary', 'filmorate', 'fullcredits'):
+        if kind in name:
+            return url + kind
+    return url
+
+def importarchive(path, maxorphans=1000):
+    # Pages of the same title or name, such as a title and its plot summary,
+    # are parsed together. Secondary pages found before their main page are
+    # kept until it turns up, for at most *maxorphans* ids at a time.
+    orphans = OrderedDict()
+    entries = ((_archiveurl(name), body) for name, body in iterarchive(path))
+    for id, group in groupby(entries, lambda entry: getid(entry[0] or '')):
+        pages = dict((url, (url, body)) for url, body in group)
+        if id is None:
+            continue
+        if id.startswith('tt'):
+            main = 'http://www.imdb.com/title/%s/' % id
         else:
-            data = parse(data).getroot()
-            results = data.cssselect('td[valign="top"]')
-           
-            for t in results:
-                i = None
-                if len(t) >= 1 and t[0].tag == 'a' and t[0].text and t[0].tail:
-                    i = 0
-                elif len(t) >= 3 and t[2].tag == 'a' and t[2].text and t[2].tail:
-                    i = 2
-                if not i is None:
-                    self.results.append(SearchResult(t[i].text.strip(), getid(t[i].attrib['href']), t[i].tail.strip()))
-
-            if self.results:
-                self.bestmatch = self.results[0]                    
-            
+            main = 'http://www.imdb.com/name/%s/' % id
+        if main not in pages:
+            orphans.setdefault(id, {}).update(pages)
+            if len(orphans) > maxorphans:
+                orphans.popitem(last=False)
+            continue
+        pages.update(orphans.pop(id, ()))
+        if id.startswith('tt'):
+            cls, kwargs = Title, {'fullplot': main + 'plotsummary' in pages}
+        else:
+            cls, kwargs = Name, {}
+        record = None
+        error = None
+        try:
+            record = cls.fromhtml(pages.pop(main)[1], id, main, pages, **kwargs).record()
+        except Exception, e:
+            error = e
+        yield (id, record, error)
+
+class Future(object):
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._error = None
+        self._callbacks = []
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise RuntimeError('Timed out waiting for result.')
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def exception(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise RuntimeError('Timed out waiting for result.')
+        return self._error
+
+    def add_done_callback(self, fn):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self, result=None, error=None):
+        with self._lock:
+            self._result = result
+            self._error = error
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+
+class WorkerPool(object):
+    # A fixed number of daemon threads running submitted calls, which also
+    # caps the number of requests in flight.
+    def __init__(self, workers=8):
+        self.workers = workers
+        self._jobs = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._run)
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            future, fn, args, kwargs = job
+            try:
+                result = fn(*args, **kwargs)
+            except Exception, e:
+                future._finish(error=e)
+            else:
+                future._finish(result)
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submitto(Future(), fn, *args, **kwargs)
+
+    def submitto(self, future, fn, *args, **kwargs):
+        if len(self._threads) < self.workers:
+            self._start()
+        self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    def close(self, cancel=False):
+        # Stops the threads once the calls submitted so far are done, or with
+        # *cancel* once the calls already running are done, failing the rest.
+        # Submitting again starts new threads.
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if cancel:
+            while True:
+                try:
+                    future = self._jobs.get_nowait()[0]
+                except Queue.Empty:
+                    break
+                future._finish(error=RuntimeError('The worker pool was closed.'))
+        for t in threads:
+            self._jobs.put(None)
+        for t in threads:
+            t.join()
+
+
+# Pool shared by all Async* instances that are not given a pool of their own.
+defaultpool = WorkerPool()
+
+class Crawler(object):
+    # Breadth-first walk from *seeds* over the edge kinds in *edges*, up to
+    # *depth* steps away. Iterating yields every Edge found. Titles and
+    # names are downloaded by up to *workers* jobs at a time on *pool*.
+    EDGES = ('cast', 'characters', 'directors', 'writers', 'filmography')
+
+    def __init__(self, seeds=(), depth=1, edges=EDGES, workers=8, maxfrontier=100000,
+                 cache=None, pool=None):
+        self.depth = depth
+        self.edges = frozenset(edges)
+        self.workers = workers
+        self.maxfrontier = maxfrontier
+        self.cache = cache
+        self.pool = pool
+        self.visited = set()
+        self.frontier = deque()
+        self.failed = []
+        self.dropped = 0
+        self._inflight = {}
+        for seed in seeds:
+            id = getid(seed) if isinstance(seed, basestring) else None
+            if id is None:
+                raise ValueError('Invalid IMDB id. (%s)' % seed)
+            self._discover(id.lower(), 0)
+
+    def _discover(self, id, depth):
+        if id in self.visited:
+            return
+        self.visited.add(id)
+        # Characters have no page to expand, names only have their filmography.
+        if id.startswith('ch') or (id.startswith('nm') and 'filmography' not in self.edges):
+            return
+        if len(self.frontier) >= self.maxfrontier:
+            self.dropped += 1
+            return
+        self.frontier.append((id, depth))
+
+    def _expand(self, id):
+        edges = []
+        if id.startswith('nm'):
+            for title, titleid in iterfilmography(id, self.cache, ids=True):
+                edges.append(Edge(id, titleid, 'filmography', title))
+            return edges
+        title = Title(id, cache=self.cache, lazy=True)
+        if 'cast' in self.edges or 'characters' in self.edges:
+            for (name, nameid), characters in title.cast:
+                if 'cast' in self.edges:
+                    edges.append(Edge(id, nameid, 'cast', name))
+                if 'characters' in self.edges and nameid is not None:
+                    for character, characterid in characters:
+                        edges.append(Edge(nameid, characterid, 'characters', character))
+        if 'directors' in self.edges:
+            for name, nameid in title.directors:
+                edges.append(Edge(id, nameid, 'directors', name))
+        if 'writers' in self.edges:
+            for writer in title.writers:
+                edges.append(Edge(id, writer[1], 'writers', writer[0]))
+        return edges
+
+    def __iter__(self):
+        pool = self.pool or defaultpool
+        done = Queue.Queue()
+        while self.frontier or self._inflight:
+            while self.frontier and len(self._inflight) < self.workers:
+                id, depth = self.frontier.popleft()
+                self._inflight[id] = depth
+                pool.submit(self._expand, id).add_done_callback(
+                    lambda future, id=id: done.put((id, future)))
+            id, future = done.get()
+            depth = self._inflight.pop(id)
+            error = future.exception()
+            if error is not None:
+                self.failed.append((id, error))
+                continue
+            for edge in future.result():
+                if edge.target is None:
+                    continue
+                if depth < self.depth:
+                    self._discover(edge.target, depth + 1)
+                elif edge.target not in self.visited:
+                    self.visited.add(edge.target)
+                yield edge
+
+    def save(self, path):
+        # Titles and names being downloaded are saved as not done yet, their
+        # edges may be yielded again after resuming.
+        state = {
+            'depth': self.depth,
+            'edges': self.edges,
+            'visited': self.visited,
+            'frontier': list(self._inflight.items()) + list(self.frontier),
+            'failed': [(id, str(error)) for id, error in self.failed],
+            'dropped': self.dropped,
+        }
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            cPickle.dump(state, f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
+
+    @classmethod
+    def resume(cls, path, **kwargs):
+        with open(path, 'rb') as f:
+            state = cPickle.load(f)
+        kwargs.setdefault('depth', state['depth'])
+        kwargs.setdefault('edges', state['edges'])
+        crawler = cls(**kwargs)
+        crawler.visited = state['visited']
+        crawler.frontier = deque(state['frontier'])
+        crawler.failed = state['failed']
+        crawler.dropped = state['dropped']
+        return crawler
+
+
+class _AsyncResult(Future):
+    _cls = None
+
+    def __init__(self, *args, **kwargs):
+        Future.__init__(self)
+        self._args = args
+        pool = kwargs.pop('pool', None) or defaultpool
+        pool.submitto(self, self._cls, *args, **kwargs)
+
+    def __repr__(self):
+        return 'imdb.%s(%s)' % (self.__class__.__name__, ', '.join(repr(a) for a in self._args))
+
+class AsyncTitle(_AsyncResult):
+    _cls = Title
+
+class AsyncName(_AsyncResult):
+    _cls = Name
+
+class AsyncTitleSearch(_AsyncResult):
+    _cls = TitleSearch
+
+class AsyncNameSearch(_AsyncResult):
+    _cls = NameSearch
+
+def refresh(items, pool=None):
+    # Revalidates already loaded titles and names concurrently. Yields
+    # (item, error) in the order given; item.changed tells whether it was
+    # downloaded and parsed again.
+    pool = pool or defaultpool
+    futures = [(item, pool.submit(item.update)) for item in items]
+    for item, future in futures:
+        yield (item, future.exception())
+
+def _jsonable(value):
+    if hasattr(value, '_asdict'):
+        return OrderedDict((name, _jsonable(v)) for name, v in value._asdict().items())
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _hydrate(query, kind, fields, fullplot):
+    # One line of input, an id, a url or a query whose best match is used,
+    # to a dict of the record of the title or name.
+    id = getid(query)
+    if id is None and query.isdigit() and len(query) <= 7:
+        id = normalizeid(int(query), 'tt' if kind == 'title' else 'nm')
+    if id is None:
+        search = (TitleSearch if kind == 'title' else NameSearch)(query)
+        if search.bestmatch is None:
+            raise NotFoundError('No match. (%s)' % query)
+        id = search.bestmatch
+    cls = {'tt': Title, 'nm': Name}.get((id.id if isinstance(id, SearchResult) else id)[:2].lower())
+    if cls is None:
+        raise ValueError('Only titles and names are supported. (%s)' % query)
+    kwargs = {}
+    if fields:
+        kwargs['fields'] = [field for field in fields if field in cls._fields or field in cls._extrafields]
+    if fullplot and cls is Title:
+        kwargs['fullplot'] = True
+    with cls(id, **kwargs) as obj:
+        record = _jsonable(obj.record())
+    if fields:
+        record = OrderedDict((name, value) for name, value in record.items() if name == 'id' or name in fields)
+    return cls.__name__.lower(), record
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='imdb', description='Download titles and names from IMDb as JSON lines.')
+    parser.add_argument('input', nargs='?', default='-', help='file with one id, url or query per line, - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='file to write to, - for stdout')
+    parser.add_argument('-k', '--kind', choices=('title', 'name'), default='title',
+                        help='what queries and bare numbers are looked up as')
+    parser.add_argument('-w', '--workers', type=int, default=8, help='lines worked on at the same time')
+    parser.add_argument('-r', '--rate', type=float, help='requests per second')
+    parser.add_argument('-c', '--cache', help='SQLite file to cache pages in')
+    parser.add_argument('--checkpoint', help='file of the lines already done, skipped on start and added to')
+    parser.add_argument('--fields', help='comma separated attributes to output')
+    parser.add_argument('--fullplot', action='store_true', help='also download the full plot of titles')
+    args = parser.parse_args(argv)
+
+    global defaultcache, defaultpolicy, defaultstats
+    if args.cache:
+        defaultcache = SQLiteCache(args.cache)
+    if args.rate:
+        defaultpolicy = FetchPolicy(rate=args.rate)
+    if defaultstats is None:
+        defaultstats = Stats()
+    fields = args.fields.split(',') if args.fields else None
+
+    done = set()
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as f:
+            done.update(line.rstrip('\n') for line in f)
+    checkpoint = open(args.checkpoint, 'a') if args.checkpoint else None
+    source = sys.stdin if args.input == '-' else open(args.input)
+    output = sys.stdout if args.output == '-' else open(args.output, 'a' if args.checkpoint else 'w')
+
+    pool = WorkerPool(args.workers)
+    pending = deque()
+    counts = {'done': 0, 'failed': 0, 'skipped': 0}
+    errors = OrderedDict()
+
+    def fail(error):
+        counts['failed'] += 1
+        errors.setdefault(type(error).__name__, []).append(str(error))
+
+    def write(line, future):
+        # Output is written in input order, and a line is only added to the
+        # checkpoint once its output is written.
+        error = future.exception()
+        if error is not None:
+            fail(error)
+            return
+        kind, record = future.result()
+        record = OrderedDict([('input', line.decode('utf-8')), ('kind', kind)] + record.items())
+        output.write(json.dumps(record) + '\n')
+        output.flush()
+        if checkpoint is not None:
+            checkpoint.write(line + '\n')
+            checkpoint.flush()
+        counts['done'] += 1
+
+    start = time.time()
+    status = 0
+    try:
+        for line in source:
+            line = line.strip()
+            if not line:
+                continue
+            if line in done:
+                counts['skipped'] += 1
+                continue
+            try:
+                query = line.decode('utf-8')
+            except UnicodeDecodeError, e:
+                fail(e)
+                continue
+            pending.append((line, pool.submit(_hydrate, query, args.kind, fields, args.fullplot)))
+            if len(pending) >= args.workers * 4:
+                write(*pending.popleft())
+        while pending:
+            write(*pending.popleft())
+    except KeyboardInterrupt:
+        status = 130
+    finally:
+        pool.close(cancel=status != 0)
+        elapsed = time.time() - start
+        counters, timings = defaultstats.snapshot()
+        print >>sys.stderr, 'imdb: %d done, %d failed, %d skipped in %.1f s, %.1f/s, %d requests, %.1f MB' % (
+            counts['done'], counts['failed'], counts['skipped'], elapsed, counts['done'] / elapsed if elapsed else 0,
+            timings.get('request', (0,))[0], counters.get('bytes', 0) / 1048576.0)
+        for name, messages in errors.items():
+            print >>sys.stderr, '  %5d %s, for example: %s' % (len(messages), name, messages[0])
+        if checkpoint is not None:
+            checkpoint.close()
+    if status == 0 and counts['failed']:
+        status = 1
+    return status
+
 if __name__ == "__main__":
-    from pprint import pprint
-    pprint(Title(TitleSearch('matrix').bestmatch).__dict__)
-    pprint(Name(NameSearch('kate beckinsale').bestmatch).__dict__)
+    sys.exit(main())
 
@@ -29,4 +29,5 @@ setup(name='imdb',
       ],
       keywords='imdb scraping movie database',
       py_modules=['imdb'],
+      entry_points={'console_scripts': ['imdb = imdb:main']},
       install_requires=['lxml'])
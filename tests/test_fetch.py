@@ -0,0 +1,179 @@
+# Downloads against a local stub server standing in for IMDb: retries,
+# missing pages, the circuit breaker and conditional requests.
+#
+#   python -m unittest discover tests
+import BaseHTTPServer
+import os
+import SocketServer
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import imdb
+
+PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'pages',
+                    'title_tt0133093.html')
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Answers each path with the statuses listed for it in server.plan, one
+    # per request, the last one from then on. Paths in server.hold wait for
+    # their event before answering.
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        # The transport talks to the stub as a proxy, with absolute urls.
+        path = '/' + self.path.split('/', 3)[3]
+        server = self.server
+        server.requests.append((path, self.headers.get('if-none-match')))
+        if path in server.hold:
+            server.hold[path].wait(5)
+        statuses = server.plan.get(path, [200])
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        if status == 200 and self.headers.get('if-none-match') == server.etag:
+            status = 304
+        body = server.body if status == 200 else ''
+        self.send_response(status)
+        self.send_header('ETag', server.etag)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class FetchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = Server(('127.0.0.1', 0), Handler)
+        with open(PAGE, 'rb') as f:
+            cls.server.body = f.read()
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.plan = {}
+        self.server.hold = {}
+        self.server.requests = []
+        self.server.etag = '"1"'
+        self.saved = imdb.defaulttransport, imdb.defaultpolicy, imdb.defaultcache, imdb.defaultstats
+        imdb.defaulttransport = imdb.HTTPTransport(proxy='127.0.0.1:%d' % self.server.server_address[1])
+        imdb.defaultpolicy = imdb.FetchPolicy(backoff=0.01, failures=2, retries=1, cooldown=0.2)
+        imdb.defaultcache = None
+        imdb.defaultstats = imdb.Stats()
+
+    def tearDown(self):
+        imdb.defaulttransport.close()
+        imdb.defaulttransport, imdb.defaultpolicy, imdb.defaultcache, imdb.defaultstats = self.saved
+
+    def paths(self):
+        return [path for path, etag in self.server.requests]
+
+    def test_retry_after_throttling(self):
+        self.server.plan['/title/tt0000001/'] = [429, 200]
+        title = imdb.Title('tt0000001')
+        self.assertEqual(title.title, 'The Matrix')
+        self.assertEqual(self.paths(), ['/title/tt0000001/'] * 2)
+        counters, timings = imdb.defaultstats.snapshot()
+        self.assertEqual(counters['throttled'], 1)
+        self.assertEqual(counters['retries'], 1)
+
+    def test_not_found(self):
+        self.server.plan['/title/tt0000002/'] = [404]
+        with self.assertRaises(imdb.NotFoundError) as cm:
+            imdb.Title('tt0000002')
+        self.assertEqual(cm.exception.status, 404)
+        self.assertTrue(isinstance(cm.exception, ValueError))
+        # Not worth retrying.
+        self.assertEqual(self.paths(), ['/title/tt0000002/'])
+
+    def test_circuit_opens_and_half_opens(self):
+        self.server.plan['/title/tt0000003/'] = [503]
+        self.assertRaises(imdb.ThrottledError, imdb.Title, 'tt0000003')
+        self.assertEqual(len(self.server.requests), 2)
+
+        # Open, nothing is sent.
+        self.assertRaises(imdb.CircuitOpenError, imdb.Title, 'tt0000001')
+        self.assertEqual(len(self.server.requests), 2)
+
+        # Half open after the cooldown, a failing trial request opens it again.
+        time.sleep(0.25)
+        self.assertRaises(imdb.ThrottledError, imdb.Title, 'tt0000003')
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertRaises(imdb.CircuitOpenError, imdb.Title, 'tt0000001')
+
+        # Only the trial request is let through while it is being answered,
+        # and closes the circuit once it succeeds.
+        time.sleep(0.25)
+        self.server.hold['/title/tt0000001/'] = threading.Event()
+        results = []
+        trial = threading.Thread(target=lambda: results.append(imdb.Title('tt0000001')))
+        trial.start()
+        while '/title/tt0000001/' not in self.paths():
+            time.sleep(0.01)
+        self.assertRaises(imdb.CircuitOpenError, imdb.Title, 'tt0000004')
+        self.server.hold.pop('/title/tt0000001/').set()
+        trial.join()
+        self.assertEqual(results[0].title, 'The Matrix')
+        self.assertEqual(imdb.Title('tt0000004').title, 'The Matrix')
+        counters, timings = imdb.defaultstats.snapshot()
+        self.assertEqual(counters['circuit.open'], 3)
+
+    def test_revalidation(self):
+        title = imdb.Title('tt0000001')
+        self.assertEqual(title.etag, '"1"')
+        self.assertTrue(title.changed)
+
+        title.update()
+        self.assertFalse(title.changed)
+        self.assertEqual(title.title, 'The Matrix')
+        self.assertEqual(self.server.requests[-1], ('/title/tt0000001/', '"1"'))
+        counters, timings = imdb.defaultstats.snapshot()
+        self.assertEqual(counters['notmodified'], 1)
+
+        self.server.etag = '"2"'
+        title.update()
+        self.assertTrue(title.changed)
+        self.assertEqual(title.etag, '"2"')
+        self.assertEqual(title.title, 'The Matrix')
+
+    def test_revalidation_cached(self):
+        imdb.defaultcache = imdb.MemoryCache()
+        imdb.Title('tt0000001')
+        title = imdb.Title('tt0000001')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(title.etag, '"1"')
+
+        title.update()
+        self.assertFalse(title.changed)
+        for item, error in imdb.refresh([title]):
+            self.assertTrue(error is None)
+            self.assertFalse(item.changed)
+        self.assertEqual(self.server.requests[1:], [('/title/tt0000001/', '"1"')] * 2)
+
+        # A changed page replaces the cached one, validators included.
+        self.server.etag = '"2"'
+        title.update()
+        self.assertTrue(title.changed)
+        self.assertEqual(imdb.Title('tt0000001').etag, '"2"')
+        self.assertEqual(len(self.server.requests), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()